@@ -3,7 +3,7 @@
 from flask import Flask, request, abort
 from flask_migrate import Migrate
 from config import Config
-from app.extensions import db, jwt, login_manager, api
+from app.extensions import db, jwt, login_manager, api, schedule_cache, password_hasher, email_service, notification_channels
 from sqlalchemy import text
 import logging
 from flask_wtf import CSRFProtect
@@ -22,8 +22,16 @@ def create_app(config_class=Config):
     db.init_app(app)
     jwt.init_app(app)
     login_manager.init_app(app)
+    # Resources must be on the Api before init_app registers them with the app
+    from app.routes_api import init_api
+    if not api.resources:
+        init_api(api)
     api.init_app(app)
     migrate.init_app(app, db)
+    schedule_cache.init_app(app)
+    password_hasher.init_app(app)
+    email_service.init_app(app)
+    notification_channels.init_app(app)
 
     # Initialize CSRF protection
     csrf.init_app(app)
@@ -34,16 +42,18 @@ def create_app(config_class=Config):
 
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return db.session.get(User, int(user_id))
+        from app.identity import load_identity
+        return load_identity(int(user_id))
 
     # Import and register blueprints here
     from app.routes import main_bp
     app.register_blueprint(main_bp)
 
-    # Set up API routes
-    from app.routes_api import init_api
-    init_api(api)
+    from app.claims import add_refreshed_token
+    app.after_request(add_refreshed_token)
+
+    from app.commands import register_commands
+    register_commands(app)
     
     logger.info("Application created successfully with config: %s", config_class)
 
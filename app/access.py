@@ -0,0 +1,64 @@
+# app/access.py
+
+from sqlalchemy import event, inspect, or_, exists, select
+from sqlalchemy.orm import Session
+from app.extensions import db, schedule_cache
+from app.models import Activity, ActivityShare, Schedule, ScheduleShare
+
+def activity_access_clause(user_id):
+    """Return the predicate matching activities ``user_id`` may see: public, own, shared or system."""
+    return or_(
+        Activity.access_level == 'public',
+        Activity.owner_id == user_id,
+        Activity.is_system.is_(True),
+        exists().where(ActivityShare.activity_id == Activity.id, ActivityShare.user_id == user_id)
+    )
+
+def schedule_access_clause(user_id):
+    """Return the predicate matching schedules ``user_id`` may see: public, own, shared or system."""
+    return or_(
+        Schedule.access_level == 'public',
+        Schedule.owner_id == user_id,
+        Schedule.is_system.is_(True),
+        exists().where(ScheduleShare.schedule_id == Schedule.id, ScheduleShare.user_id == user_id)
+    )
+
+def get_accessible_activities(user_id):
+    return Activity.query.filter(activity_access_clause(user_id))
+
+def get_accessible_schedules(user_id):
+    return Schedule.query.filter(schedule_access_clause(user_id))
+
+def _accessible_ids(kind, model, clause, user_id):
+    # Keyed by the catalog-wide and per-user versions, so either kind of write retires the entry
+    kind_version, user_version = schedule_cache.versions([kind, f'access:{user_id}'])
+    key = f'access:{kind}:{user_id}:{kind_version}:{user_version}'
+    ids = schedule_cache.get(key)
+    if ids is None:
+        ids = db.session.execute(select(model.id).where(clause).order_by(model.id)).scalars().all()
+        schedule_cache.set(key, ids)
+    return frozenset(ids)
+
+def accessible_activity_ids(user_id):
+    """Return the ids of every activity ``user_id`` may see, cached until activities or the user's access change."""
+    return _accessible_ids('activities', Activity, activity_access_clause(user_id), user_id)
+
+def invalidate_access(user_id):
+    """Call before committing a schedule or activity for ``user_id``; share rows written through the ORM do it themselves."""
+    schedule_cache.bump(f'access:{user_id}')
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_shared_users(session, flush_context):
+    """Bump ``access:<user_id>`` for every user gaining or losing a share, with the flush's transaction.
+
+    Covers ActivityShare and ScheduleShare rows added, changed or deleted
+    through the session; bulk query updates and deletes bypass it and must
+    call ``invalidate_access``.
+    """
+    user_ids = set()
+    for share in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(share, (ActivityShare, ScheduleShare)):
+            history = inspect(share).attrs.user_id.history
+            user_ids.update(value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None)
+    for user_id in user_ids:
+        schedule_cache.bump(f'access:{user_id}', session)
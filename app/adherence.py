@@ -0,0 +1,133 @@
+# app/adherence.py
+
+from collections import defaultdict
+from datetime import datetime, time, timezone
+from sqlalchemy import select, delete, func, cast, case, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import ActivityInstance, ScheduleActivity, Activity, DailyAdherence
+
+COUNTS = ('scheduled', 'completed', 'notifications')
+
+DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+_table = DailyAdherence.__table__
+
+def _local_date(instance_date, user_tz):
+    # app.utils records into the rollup, so it can only be imported lazily here
+    from app.utils import _as_utc
+    return _as_utc(instance_date).astimezone(user_tz).date()
+
+def _apply(deltas):
+    """Add ``{(user_id, local_date, category_id): [scheduled, completed, notifications]}`` to the rollup.
+
+    One upsert per call: new keys are inserted and existing ones incremented
+    in place, so concurrent writers never lose each other's counts.
+    """
+    deltas = {key: counts for key, counts in deltas.items() if any(counts)}
+    if not deltas:
+        return
+    insert = DIALECT_INSERTS[db.session.get_bind().dialect.name](_table)
+    db.session.execute(
+        insert.on_conflict_do_update(
+            index_elements=['user_id', 'local_date', 'category_id'],
+            set_={name: _table.c[name] + insert.excluded[name] for name in COUNTS}
+        ),
+        [
+            {'user_id': user_id, 'local_date': local_date, 'category_id': category_id, **dict(zip(COUNTS, counts))}
+            for (user_id, local_date, category_id), counts in deltas.items()
+        ]
+    )
+
+def record_instances(user_id, rows, user_tz):
+    """Count newly stored instance rows; ``rows`` are ``expand_instance_rows`` tuples.
+
+    Call before committing the insert so both land in the same transaction.
+    """
+    if not rows:
+        return
+    categories = dict(db.session.execute(
+        select(ScheduleActivity.id, Activity.category_id)
+        .join(Activity, ScheduleActivity.activity_id == Activity.id)
+        .where(ScheduleActivity.id.in_({schedule_activity_id for schedule_activity_id, _, _ in rows}))
+    ).all())
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for schedule_activity_id, instance_date, generate_notifications in rows:
+        counts = deltas[(user_id, _local_date(instance_date, user_tz), categories[schedule_activity_id])]
+        counts[0] += 1
+        counts[2] += 1 if generate_notifications else 0
+    _apply(deltas)
+
+def record_change(instance, user_tz, completed=0, notifications=0):
+    """Adjust the counts of one stored instance's day, e.g. ``completed=1`` when it is completed."""
+    schedule_activity = instance.schedule_activity
+    local_date = _local_date(instance.instance_date, user_tz)
+    _apply({
+        (schedule_activity.schedule.user_id, local_date, schedule_activity.activity.category_id): [0, completed, notifications]
+    })
+
+def _aggregate(user_id, user_tz, start_utc):
+    table = ActivityInstance.__table__
+    query = select().select_from(
+        table.join(ScheduleActivity.__table__, table.c.schedule_activity_id == ScheduleActivity.__table__.c.id)
+        .join(Activity.__table__, ScheduleActivity.__table__.c.activity_id == Activity.__table__.c.id)
+    ).where(table.c.user_id == user_id)
+    if start_utc is not None:
+        query = query.where(table.c.instance_date >= start_utc)
+    category_id = Activity.__table__.c.category_id
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        local_date = cast(func.timezone(user_tz.key, table.c.instance_date), Date)
+        rows = db.session.execute(
+            query.add_columns(
+                local_date, category_id, func.count(),
+                func.sum(case((table.c.completed, 1), else_=0)),
+                func.sum(case((table.c.generate_notifications, 1), else_=0))
+            ).group_by(local_date, category_id)
+        )
+        return {(user_id, day, category): [int(count) for count in counts] for day, category, *counts in rows}
+
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for instance_date, category, completed, generate_notifications in db.session.execute(
+        query.add_columns(table.c.instance_date, category_id, table.c.completed, table.c.generate_notifications)
+    ):
+        counts = deltas[(user_id, _local_date(instance_date, user_tz), category)]
+        counts[0] += 1
+        counts[1] += 1 if completed else 0
+        counts[2] += 1 if generate_notifications else 0
+    return deltas
+
+def refresh(user_id, user_tz, start_date=None):
+    """Recompute a user's rollup rows from ``start_date`` (a local date) on, or all of them.
+
+    Used after changes that move or remove instances in bulk; reads only the
+    user's instances in the range, through the (user_id, instance_date) index.
+    """
+    start_utc = None
+    statement = delete(_table).where(_table.c.user_id == user_id)
+    if start_date is not None:
+        start_utc = datetime.combine(start_date, time.min, tzinfo=user_tz).astimezone(timezone.utc)
+        statement = statement.where(_table.c.local_date >= start_date)
+    db.session.execute(statement)
+    _apply(_aggregate(user_id, user_tz, start_utc))
+
+def completion_rate(completed, scheduled):
+    return round(completed / scheduled, 4) if scheduled else None
+
+def daily_stats(user_ids, start_date, end_date, category_id=None):
+    """Return ``{user_id: [(local_date, scheduled, completed, notifications), ...]}`` from the rollup alone."""
+    query = select(
+        _table.c.user_id, _table.c.local_date,
+        *(func.sum(_table.c[name]) for name in COUNTS)
+    ).where(
+        _table.c.user_id.in_(user_ids),
+        _table.c.local_date >= start_date,
+        _table.c.local_date <= end_date
+    ).group_by(_table.c.user_id, _table.c.local_date).order_by(_table.c.user_id, _table.c.local_date)
+    if category_id is not None:
+        query = query.where(_table.c.category_id == category_id)
+
+    stats = {user_id: [] for user_id in user_ids}
+    for user_id, local_date, *counts in db.session.execute(query):
+        stats[user_id].append((local_date, *(int(count) for count in counts)))
+    return stats
@@ -0,0 +1,190 @@
+# app/cache.py
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+
+DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def _store():
+    # app.extensions builds the cache before the models exist, so they are imported lazily
+    from app.extensions import db
+    from app.models import CacheVersion
+    return db, CacheVersion.__table__
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class RedisBackend:
+    """Shared backend over a redis-py compatible client; values are stored as JSON."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_counters(self, keys):
+        return [int(value or 0) for value in self.client.mget(keys)]
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+class ScheduleCache:
+    """Cache of rendered day schedules keyed by user and local date.
+
+    Entries are written under a per-user version; ``invalidate_user`` bumps the
+    version so every cached day of that user is skipped at once. The same
+    named version counters back the ETags of the JSON endpoints. Entries and
+    counters go to Redis when SCHEDULE_CACHE_URL is set. Otherwise entries
+    live in an in-process LRU and the counters in the cache_versions table,
+    so a bump in one worker still retires the entries of all of them. Tests
+    may swap ``backend`` for any object with the same methods.
+
+    Bumps and discards join the caller's unit of work: call them before
+    committing the write they cover. Database counters are written in that
+    transaction, Redis counters and discards are applied once it commits, and
+    a rollback drops them.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SCHEDULE_CACHE_URL', None)
+        app.config.setdefault('SCHEDULE_CACHE_SIZE', 4096)
+        app.config.setdefault('SCHEDULE_CACHE_TTL', 300)
+
+        if app.config['SCHEDULE_CACHE_URL']:
+            import redis
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['SCHEDULE_CACHE_URL']))
+        else:
+            self.backend = MemoryBackend(app.config['SCHEDULE_CACHE_SIZE'])
+        self.ttl = app.config['SCHEDULE_CACHE_TTL']
+        if not self._listening:
+            event.listen(Session, 'before_commit', self._write_bumps)
+            event.listen(Session, 'after_commit', self._apply_pending)
+            event.listen(Session, 'after_rollback', self._drop_pending)
+            self._listening = True
+        app.extensions['schedule_cache'] = self
+
+    @property
+    def shared(self):
+        """Whether the backend keeps the counters itself, so reading them needs no database query."""
+        return hasattr(self.backend, 'incr')
+
+    def versions(self, names):
+        """Return the current version of each named counter in one round trip; unknown names are 0."""
+        if self.shared:
+            return self.backend.get_counters([f'version:{name}' for name in names])
+        db, table = _store()
+        stored = dict(db.session.execute(
+            select(table.c.name, table.c.version).where(table.c.name.in_(set(names)))
+        ).all())
+        return [stored.get(name, 0) for name in names]
+
+    def version(self, name):
+        return self.versions([name])[0]
+
+    def _pending(self, session=None):
+        if session is None:
+            session = _store()[0].session
+        return session.info.setdefault('schedule_cache', {'bumps': set(), 'discards': set()})
+
+    def bump(self, name, session=None):
+        """Increment counter ``name`` when the current transaction (of ``session`` if given) commits."""
+        self._pending(session)['bumps'].add(name)
+
+    def discard(self, key, session=None):
+        """Delete entry ``key`` from the backend once the current transaction commits."""
+        self._pending(session)['discards'].add(key)
+
+    def _write_bumps(self, session):
+        # Flush first so bumps made by flush hooks land in this transaction too
+        session.flush()
+        pending = session.info.get('schedule_cache')
+        if not pending or not pending['bumps'] or self.shared:
+            return
+        _, table = _store()
+        insert = DIALECT_INSERTS[session.get_bind().dialect.name](table)
+        session.execute(
+            insert.on_conflict_do_update(index_elements=['name'], set_={'version': table.c.version + 1}),
+            [{'name': name, 'version': 1} for name in sorted(pending['bumps'])]
+        )
+        pending['bumps'].clear()
+
+    def _apply_pending(self, session):
+        pending = session.info.pop('schedule_cache', None)
+        if not pending:
+            return
+        for name in pending['bumps']:
+            self.backend.incr(f'version:{name}')
+        for key in pending['discards']:
+            self.backend.delete(key)
+
+    def _drop_pending(self, session):
+        session.info.pop('schedule_cache', None)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl=ttl or self.ttl)
+
+    def _key(self, user_id, tz_name, local_date):
+        version = self.version(f'user:{user_id}')
+        return f'schedule:{user_id}:{version}:{tz_name}:{local_date.isoformat()}'
+
+    def get_day(self, user_id, tz_name, local_date):
+        return self.backend.get(self._key(user_id, tz_name, local_date))
+
+    def set_day(self, user_id, tz_name, local_date, rows):
+        self.backend.set(self._key(user_id, tz_name, local_date), rows, ttl=self.ttl)
+
+    def invalidate_user(self, user_id):
+        if user_id is not None:
+            self.bump(f'user:{user_id}')
@@ -0,0 +1,77 @@
+# app/catalog.py
+
+import bisect
+import time
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from app.extensions import db, schedule_cache
+from app.models import Activity
+
+CATALOG_COLUMNS = (
+    Activity.id, Activity.category_id, Activity.title, Activity.duration, Activity.difficulty, Activity.exertion
+)
+
+MAX_PAGE_SIZE = 500
+
+# (version, loaded_at, entries ordered by id, entries by category_id), rebuilt when
+# "activities" is bumped or after CATALOG_TTL seconds
+_catalog = None
+
+def _load_catalog():
+    activities = db.session.execute(
+        select(Activity).options(load_only(*CATALOG_COLUMNS)).order_by(Activity.id)
+    ).scalars()
+    entries = tuple({
+        "id": activity.id,
+        "category_id": activity.category_id,
+        "title": activity.title,
+        "duration": activity.duration,
+        "difficulty": activity.difficulty,
+        "exertion": activity.exertion
+    } for activity in activities)
+
+    by_category = {}
+    for entry in entries:
+        by_category.setdefault(entry["category_id"], []).append(entry)
+    return entries, by_category
+
+def get_catalog(category_id=None):
+    """Return the catalog entries ordered by id, optionally for one category.
+
+    Entries are plain dicts of the listing columns; the text, welcome and media
+    columns are never loaded. Each process keeps one copy, rebuilt when the
+    shared "activities" version moves, so ``invalidate_catalog`` in
+    any worker reaches all of them, and at least every CATALOG_TTL seconds
+    for writes that bypass it.
+    """
+    global _catalog
+    version = schedule_cache.version('activities')
+    now = time.monotonic()
+    if _catalog is None or _catalog[0] != version or now - _catalog[1] >= current_app.config['CATALOG_TTL']:
+        _catalog = (version, now, *_load_catalog())
+    _, _, entries, by_category = _catalog
+    if category_id is None:
+        return entries
+    return by_category.get(category_id, ())
+
+def list_activities(category_id=None, after_id=None, limit=None, allowed_ids=None):
+    """Return a keyset page of catalog entries with ids above ``after_id``.
+
+    ``allowed_ids`` restricts the page to those activities, typically
+    ``access.accessible_activity_ids``. Returns ``(entries, next_after_id)``;
+    ``next_after_id`` is ``None`` on the last page. Without a ``limit`` the
+    rest of the catalog is returned.
+    """
+    entries = get_catalog(category_id)
+    if allowed_ids is not None:
+        entries = [entry for entry in entries if entry["id"] in allowed_ids]
+    start = 0 if after_id is None else bisect.bisect_right(entries, after_id, key=lambda entry: entry["id"])
+    if limit is None:
+        return entries[start:], None
+    page = entries[start:start + limit]
+    next_after_id = page[-1]["id"] if start + limit < len(entries) else None
+    return page, next_after_id
+
+def invalidate_catalog():
+    schedule_cache.bump('activities')
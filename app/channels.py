@@ -0,0 +1,219 @@
+# app/channels.py
+
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+from app.email_service import DeliveryResult, FakeTransport
+
+logger = logging.getLogger(__name__)
+
+# Per-channel limits; NOTIFICATION_CHANNEL_LIMITS overrides any of them
+CHANNEL_DEFAULTS = {
+    'email': {'rate': 50.0, 'burst': 500, 'max_concurrency': 4},
+    'sms': {'rate': 1.0, 'burst': 10, 'max_concurrency': 2},
+    'push': {'rate': 100.0, 'burst': 500, 'max_concurrency': 4},
+}
+
+class SmsMessage(NamedTuple):
+    to: str
+    body: str
+
+class PushMessage(NamedTuple):
+    to: int  # User id
+    title: str
+    body: str
+
+class SendOutcome(NamedTuple):
+    """Items a channel did not deliver: ``failed`` count an attempt, ``deferred`` do not."""
+    failed: tuple = ()
+    deferred: tuple = ()
+    retry_after: Optional[float] = None
+
+class TokenBucket:
+    """Allows ``rate`` sends per second on average with bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, count):
+        """Take up to ``count`` tokens without waiting; returns how many were granted."""
+        with self._lock:
+            self._refill()
+            granted = min(count, int(self._tokens))
+            self._tokens -= granted
+            return granted
+
+    def wait_time(self):
+        """Seconds until at least one token is available."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` failed calls in a row and fails fast for ``reset_seconds``.
+
+    Once the timeout passes one trial call is let through (half-open); its
+    result closes the breaker again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        return 'half-open' if self.remaining() == 0 else 'open'
+
+    def remaining(self):
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self.remaining() > 0 or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            if self._opened_at is not None or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+class LogTransport:
+    """Logs each message; the default until a provider is configured for the channel."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def send_batch(self, messages):
+        for message in messages:
+            logger.info("%s notification: %r", self.name, message)
+        return [DeliveryResult(message.to, True) for message in messages]
+
+class EmailTransport:
+    """Adapts the EmailService to the channel transport interface."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def send_batch(self, messages):
+        return self.service.send_many(messages)
+
+class Channel:
+    """One delivery channel guarded by a token bucket, a concurrency cap and a circuit breaker.
+
+    ``send`` never waits on the channel: items over the rate or the cap, and
+    everything while the breaker is open, come back as deferred so the caller
+    can retry them later without blocking the other channels.
+    """
+
+    def __init__(self, name, transport, rate, burst, max_concurrency, failure_threshold=5, reset_seconds=30):
+        self.name = name
+        self.transport = transport
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def send(self, items):
+        """Send ``(key, message)`` pairs and return a SendOutcome of the keys not delivered."""
+        keys = tuple(key for key, _ in items)
+        if not items:
+            return SendOutcome()
+        if not self._slots.acquire(blocking=False):
+            return SendOutcome(deferred=keys, retry_after=1.0)
+        try:
+            if not self.breaker.allow():
+                return SendOutcome(deferred=keys, retry_after=self.breaker.remaining() or 1.0)
+
+            granted = self.bucket.take(len(items))
+            deferred = keys[granted:]
+            retry_after = self.bucket.wait_time() if deferred else None
+            batch = items[:granted]
+            if not batch:
+                return SendOutcome(deferred=deferred, retry_after=retry_after)
+
+            try:
+                results = self.transport.send_batch([message for _, message in batch])
+            except Exception:
+                logger.exception("%s transport failed for %d messages", self.name, len(batch))
+                self.breaker.record(False)
+                return SendOutcome(failed=tuple(key for key, _ in batch), deferred=deferred, retry_after=retry_after)
+
+            failed = tuple(key for (key, _), result in zip(batch, results) if not result.ok)
+            self.breaker.record(len(failed) < len(batch))
+            return SendOutcome(failed=failed, deferred=deferred, retry_after=retry_after)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {'breaker': self.breaker.state, 'failures': self.breaker.failures, 'wait_time': self.bucket.wait_time()}
+
+class Channels:
+    """Builds the notification channels from config.
+
+    NOTIFICATION_SMS_TRANSPORT and NOTIFICATION_PUSH_TRANSPORT pick ``log``
+    or ``fake`` (the email FakeTransport); email always goes through the
+    EmailService. A transport's ``send_batch`` returns one DeliveryResult
+    per message. Tests may replace a channel's ``transport`` directly.
+    """
+
+    def __init__(self, app=None):
+        self.channels = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('NOTIFICATION_CHANNEL_LIMITS', {})
+        app.config.setdefault('NOTIFICATION_SMS_TRANSPORT', 'log')
+        app.config.setdefault('NOTIFICATION_PUSH_TRANSPORT', 'log')
+        app.config.setdefault('NOTIFICATION_BREAKER_THRESHOLD', 5)
+        app.config.setdefault('NOTIFICATION_BREAKER_RESET_SECONDS', 30)
+
+        config = app.config
+        transports = {'email': EmailTransport(app.extensions['email_service'])}
+        for name in ('sms', 'push'):
+            kind = config[f'NOTIFICATION_{name.upper()}_TRANSPORT']
+            transports[name] = FakeTransport() if kind == 'fake' else LogTransport(name)
+
+        self.channels = {
+            name: Channel(
+                name, transports[name],
+                failure_threshold=config['NOTIFICATION_BREAKER_THRESHOLD'],
+                reset_seconds=config['NOTIFICATION_BREAKER_RESET_SECONDS'],
+                **{**limits, **config['NOTIFICATION_CHANNEL_LIMITS'].get(name, {})}
+            )
+            for name, limits in CHANNEL_DEFAULTS.items()
+        }
+        app.extensions['notification_channels'] = self
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def stats(self):
+        return {name: channel.stats() for name, channel in self.channels.items()}
@@ -0,0 +1,61 @@
+# app/claims.py
+
+from typing import NamedTuple
+from flask import g
+from flask_jwt_extended import create_access_token, get_jwt
+from sqlalchemy import select
+from app.extensions import db, schedule_cache
+from app.models import Type, User, UserType
+from app.recurrence import get_zone
+
+# Sent on API responses whose token carried outdated claims
+REFRESHED_TOKEN_HEADER = 'X-Refreshed-Token'
+
+class TokenIdentity(NamedTuple):
+    """The API caller as described by their access token's claims."""
+    id: int
+    timezone: str
+    roles: tuple
+
+    @property
+    def zone(self):
+        return get_zone(self.timezone)
+
+def user_roles(user_id):
+    return tuple(db.session.execute(
+        select(Type.type).join(UserType, UserType.type_id == Type.id).where(UserType.user_id == user_id).order_by(Type.type)
+    ).scalars())
+
+def _version(user_id):
+    # Only a shared cache can tell every worker about a revocation; without one tokens live out their lifetime
+    return schedule_cache.version(f'identity:{user_id}') if schedule_cache.shared else 0
+
+def _claims(user_id):
+    timezone = db.session.execute(select(User.timezone).where(User.id == user_id)).scalar_one()
+    return {'tz': timezone, 'roles': list(user_roles(user_id)), 'ver': _version(user_id)}
+
+def issue_token(user_id, claims=None):
+    """Mint an access token whose claims carry the user's timezone, roles and identity version."""
+    return create_access_token(identity=str(user_id), additional_claims=claims or _claims(user_id))
+
+def api_identity():
+    """Return the TokenIdentity of the current JWT request from its claims.
+
+    The signed claims are trusted for the token's lifetime; the database is
+    not read. With a shared cache, tokens minted before the user's last
+    ``invalidate_identity`` are answered from fresh data instead, and a
+    replacement token is returned to the client in the X-Refreshed-Token
+    header by ``add_refreshed_token``.
+    """
+    claims = get_jwt()
+    user_id = int(claims['sub'])
+    if schedule_cache.shared and claims.get('ver') != _version(user_id):
+        claims = _claims(user_id)
+        g.refreshed_token = issue_token(user_id, claims)
+    return TokenIdentity(user_id, claims['tz'], tuple(claims.get('roles', ())))
+
+def add_refreshed_token(response):
+    refreshed_token = g.pop('refreshed_token', None)
+    if refreshed_token is not None:
+        response.headers[REFRESHED_TOKEN_HEADER] = refreshed_token
+    return response
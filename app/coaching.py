@@ -0,0 +1,68 @@
+# app/coaching.py
+
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, func
+from app.adherence import completion_rate, daily_stats
+from app.extensions import db, schedule_cache
+from app.models import CoachClient, DailyAdherence, User
+from app.recurrence import get_zone
+
+WINDOWS = (7, 30)
+
+def _client_summary(client, days, last_active):
+    today = datetime.now(get_zone(client.timezone or 'UTC')).date()
+    by_date = {local_date: (scheduled, completed) for local_date, scheduled, completed, _ in days}
+    today_scheduled, today_completed = by_date.get(today, (0, 0))
+
+    summary = {
+        "client_id": client.id,
+        "first_name": client.first_name,
+        "last_name": client.last_name,
+        "timezone": client.timezone,
+        "today": {"scheduled": today_scheduled, "completed": today_completed},
+        "last_active": last_active.isoformat() if last_active else None,
+    }
+    for window in WINDOWS:
+        start = today - timedelta(days=window - 1)
+        scheduled = sum(counts[0] for local_date, counts in by_date.items() if start <= local_date <= today)
+        completed = sum(counts[1] for local_date, counts in by_date.items() if start <= local_date <= today)
+        summary[f"completion_rate_{window}d"] = completion_rate(completed, scheduled)
+    return summary
+
+def coach_dashboard(coach_id):
+    """Return today's progress, 7/30-day completion rates and last active day for each of a coach's clients.
+
+    Built from the daily_adherence rollup in three queries whatever the number
+    of clients: the client list, their daily counts over the widest window and
+    their last day with a completion. Each client's "today" is taken in their
+    own timezone. Cached per coach for COACH_DASHBOARD_TTL seconds.
+    """
+    key = f'coach:{coach_id}'
+    cached = schedule_cache.get(key)
+    if cached is not None:
+        return cached
+
+    clients = db.session.execute(
+        select(User.id, User.first_name, User.last_name, User.timezone)
+        .join(CoachClient, CoachClient.client_id == User.id)
+        .where(CoachClient.coach_id == coach_id)
+        .order_by(User.last_name, User.first_name, User.id)
+    ).all()
+    client_ids = [client.id for client in clients]
+
+    summaries = []
+    if client_ids:
+        # Clients a day ahead or behind UTC still fall inside this span
+        utc_today = datetime.now(timezone.utc).date()
+        stats = daily_stats(client_ids, utc_today - timedelta(days=max(WINDOWS)), utc_today + timedelta(days=1))
+        rollup = DailyAdherence.__table__
+        last_active = dict(db.session.execute(
+            select(rollup.c.user_id, func.max(rollup.c.local_date))
+            .where(rollup.c.user_id.in_(client_ids), rollup.c.completed > 0)
+            .group_by(rollup.c.user_id)
+        ).all())
+        summaries = [_client_summary(client, stats[client.id], last_active.get(client.id)) for client in clients]
+
+    schedule_cache.set(key, summaries, ttl=current_app.config['COACH_DASHBOARD_TTL'])
+    return summaries
@@ -0,0 +1,116 @@
+# app/commands.py
+
+import click
+import time
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import or_, select
+from sqlalchemy.orm import joinedload
+from app.extensions import db
+from app.models import Schedule, ScheduleActivity, ActivityInstance, User
+from app import adherence
+from app.recurrence import get_zone, cache_stats
+from app.utils import extend_activity_instances
+from app.regeneration import regenerate_all
+from app.jobs import work
+from app.notifications import Dispatcher, deliver
+
+def register_commands(app):
+    app.cli.add_command(extend_instances_command)
+    app.cli.add_command(regenerate_instances_command)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(dispatch_notifications_command)
+    app.cli.add_command(deliver_notifications_command)
+    app.cli.add_command(backfill_adherence_command)
+
+@click.command('extend-instances')
+@click.option('--horizon-days', type=int, default=None, help='Days ahead to materialize (defaults to INSTANCE_HORIZON_DAYS).')
+@click.option('--chunk-days', type=int, default=None, help='Days written per checkpoint (defaults to INSTANCE_CHUNK_DAYS).')
+def extend_instances_command(horizon_days, chunk_days):
+    """Materialize activity instances up to the rolling horizon."""
+    horizon_days = horizon_days or current_app.config['INSTANCE_HORIZON_DAYS']
+    chunk_days = chunk_days or current_app.config['INSTANCE_CHUNK_DAYS']
+    horizon_end = datetime.now(timezone.utc) + timedelta(days=horizon_days)
+
+    # Activities whose watermark already reached the horizon are skipped, so
+    # rerunning after an interruption picks up where the last checkpoint left off
+    pending = ScheduleActivity.query.filter(
+        or_(ScheduleActivity.materialized_until.is_(None), ScheduleActivity.materialized_until < horizon_end)
+    ).options(
+        joinedload(ScheduleActivity.schedule).joinedload(Schedule.user)
+    ).order_by(ScheduleActivity.id).all()
+
+    inserted = 0
+    for schedule_activity in pending:
+        user_tz = get_zone(schedule_activity.schedule.user.timezone)
+        inserted += extend_activity_instances(schedule_activity, user_tz, horizon_end, chunk_days)
+
+    click.echo(f"Extended {len(pending)} ScheduleActivities, inserted {inserted} instances")
+    occurrences = cache_stats()['occurrences']
+    click.echo(f"Occurrence cache: {occurrences['hits']} hits, {occurrences['misses']} misses")
+
+@click.command('regenerate-instances')
+@click.option('--workers', type=int, default=1, help='Worker processes; users are sharded across them.')
+def regenerate_instances_command(workers):
+    """Reconcile and extend activity instances for every user."""
+    for shard, summary in enumerate(regenerate_all(workers)):
+        click.echo(
+            f"Shard {shard}: {summary['users']} users, {summary['schedule_activities']} ScheduleActivities, "
+            f"{summary['inserted']} inserted, {summary['updated']} updated, {summary['deleted']} deleted"
+        )
+
+@click.command('worker')
+@click.option('--concurrency', type=int, default=4, help='Jobs run at once on the thread pool.')
+@click.option('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+def worker_command(concurrency, poll_interval, burst):
+    """Run queued background jobs."""
+    processed = work(current_app._get_current_object(), concurrency, poll_interval, burst)
+    click.echo(f"Processed {processed} jobs")
+
+@click.command('dispatch-notifications')
+@click.option('--tick-seconds', type=int, default=10, help='Timing wheel slot width and loop interval.')
+@click.option('--lookahead-minutes', type=int, default=10, help='How far ahead due reminders are loaded.')
+@click.option('--batch-size', type=int, default=500, help='Reminders handed to a sender at once.')
+@click.option('--refresh-seconds', type=int, default=300, help='Interval between full rescans of the lookahead window.')
+@click.option('--once', is_flag=True, help='Run a single tick and exit.')
+@click.option('--no-deliver', is_flag=True, help='Only fill the outbox; leave sending to deliver-notifications.')
+def dispatch_notifications_command(tick_seconds, lookahead_minutes, batch_size, refresh_seconds, once, no_deliver):
+    """Send reminders for instances as they come due."""
+    dispatcher = Dispatcher(tick_seconds, lookahead_minutes, batch_size, refresh_seconds, deliver=not no_deliver)
+    sent = dispatcher.run(once=once)
+    click.echo(f"Dispatched {sent} reminders")
+
+@click.command('deliver-notifications')
+@click.option('--batch-size', type=int, default=500, help='Outbox rows claimed at once.')
+@click.option('--poll-interval', type=float, default=1.0, help='Seconds to sleep when nothing is due.')
+@click.option('--burst', is_flag=True, help='Exit once nothing is due.')
+@click.option('--channel', default=None, help='Only deliver this channel, e.g. to give a slow provider its own worker.')
+def deliver_notifications_command(batch_size, poll_interval, burst, channel):
+    """Send pending reminders from the notification outbox."""
+    delivered = 0
+    while True:
+        sent = deliver(batch_size=batch_size, channel=channel)
+        delivered += sent
+        if not sent:
+            if burst:
+                break
+            time.sleep(poll_interval)
+    click.echo(f"Delivered {delivered} reminders")
+
+@click.command('backfill-adherence')
+@click.option('--user-id', type=int, multiple=True, help='Only rebuild these users (repeatable).')
+def backfill_adherence_command(user_id):
+    """Rebuild the daily adherence rollup from stored instances."""
+    query = select(User.id, User.timezone).where(
+        select(ActivityInstance.id).where(ActivityInstance.user_id == User.id).exists()
+    ).order_by(User.id)
+    if user_id:
+        query = query.where(User.id.in_(user_id))
+
+    users = db.session.execute(query).all()
+    for rebuilt_user_id, tz_name in users:
+        # One transaction per user keeps each rebuild short
+        adherence.refresh(rebuilt_user_id, get_zone(tz_name or 'UTC'))
+        db.session.commit()
+    click.echo(f"Rebuilt adherence for {len(users)} users")
@@ -1,5 +1,10 @@
-# simple_auth/sawa/email_service/__init__.py
+# app/email_service/__init__.py
 
-from .email_service import send_email
+from .email_service import EmailService, login_code_message, send_email
+from .templates import render
+from .transports import EmailMessage, DeliveryResult, FakeTransport, PostmarkTransport, TransientEmailError
 
-__all__ = ['send_email']
\ No newline at end of file
+__all__ = [
+    'EmailService', 'EmailMessage', 'DeliveryResult', 'FakeTransport', 'PostmarkTransport',
+    'TransientEmailError', 'login_code_message', 'render', 'send_email'
+]
@@ -1,87 +1,94 @@
-# simple_auth/sawa/email_service/email_service.py
+# app/email_service/email_service.py
 
-from postmarker.core import PostmarkClient
-from sawa.config import config
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from .templates import render
+from .transports import EmailMessage, DeliveryResult, FakeTransport, PostmarkTransport, TransientEmailError
 
-postmark_api_key = config.POSTMARK_API_KEY
-postmark_sender_email = config.POSTMARK_SENDER_EMAIL
+logger = logging.getLogger(__name__)
 
-postmark = PostmarkClient(postmark_api_key)
+class EmailService:
+    """Delivers EmailMessages in provider-sized batches with bounded concurrency.
 
-def generate_token_email_body(token):
-    return f"""
-    <html>
-    <head>
-        <style>
-            .container {{
-                font-family: Arial, sans-serif;
-                margin: 0 auto;
-                padding: 20px;
-                max-width: 600px;
-                border: 1px solid #ddd;
-                border-radius: 5px;
-                background-color: #f9f9f9;
-            }}
-            .header {{
-                font-size: 24px;
-                font-weight: bold;
-                color: #333;
-                margin-bottom: 20px;
-            }}
-            .body {{
-                font-size: 16px;
-                color: #555;
-                margin-bottom: 20px;
-            }}
-            .token {{
-                font-size: 20px;
-                font-weight: bold;
-                color: #007bff;
-                margin: 20px 0;
-            }}
-            .footer {{
-                font-size: 14px;
-                color: #999;
-                margin-top: 30px;
-                border-top: 1px solid #eee;
-                padding-top: 10px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">Your Superintendent App Login Code</div>
-            <div class="body">
-                <p>Hello,</p>
-                <p>Here is your app login code. Please copy/paste to complete your login. This token is valid for a limited time, so be sure to use it promptly.</p>
-                <div class="token">{token}</div>
-                <p>If you did not request this token, please ignore this email or contact support if you have any concerns.</p>
-            </div>
-            <div class="footer">
-                <p>Thank you,</p>
-                <p>The Tech4Equity Team</p>
-            </div>
-        </div>
-    </body>
-    </html>
+    Batches of EMAIL_BATCH_SIZE go to the transport on at most
+    EMAIL_MAX_CONCURRENCY threads. A batch that fails transiently is retried
+    EMAIL_MAX_RETRIES times with jittered exponential backoff starting at
+    EMAIL_RETRY_BACKOFF seconds. EMAIL_TRANSPORT selects ``postmark`` or the
+    in-memory ``fake``; ``transport`` may also be replaced directly.
     """
 
-def send_email(to, otp):
-    body = generate_token_email_body(otp)
-    try:
-        response = postmark.emails.send(
-            From=postmark_sender_email,
-            To=to,
-            Subject=f"{otp} is your Sup App login code",
-            HtmlBody=body
-        )
-        return response
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        return None
+    def __init__(self, app=None):
+        self.transport = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EMAIL_TRANSPORT', 'postmark')
+        app.config.setdefault('EMAIL_BATCH_SIZE', 500)
+        app.config.setdefault('EMAIL_MAX_CONCURRENCY', 4)
+        app.config.setdefault('EMAIL_MAX_RETRIES', 3)
+        app.config.setdefault('EMAIL_RETRY_BACKOFF', 0.5)
+
+        config = app.config
+        if config['EMAIL_TRANSPORT'] == 'fake':
+            self.transport = FakeTransport()
+        else:
+            # Built on first use so apps without credentials (CLI, tests) still start
+            self.transport = None
+        self.batch_size = config['EMAIL_BATCH_SIZE']
+        self.max_concurrency = config['EMAIL_MAX_CONCURRENCY']
+        self.max_retries = config['EMAIL_MAX_RETRIES']
+        self.retry_backoff = config['EMAIL_RETRY_BACKOFF']
+        app.extensions['email_service'] = self
+
+    def _transport(self):
+        if self.transport is None:
+            config = current_app.config
+            self.transport = PostmarkTransport(
+                config['POSTMARK_API_KEY'], config['POSTMARK_SENDER_EMAIL'], pool_size=self.max_concurrency
+            )
+        return self.transport
+
+    def _send_batch(self, transport, messages):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return transport.send_batch(messages)
+            except TransientEmailError as e:
+                if attempt == self.max_retries:
+                    logger.error("Giving up on %d emails after %d attempts: %s", len(messages), attempt + 1, e)
+                    return [DeliveryResult(message.to, False, error=str(e), retryable=True) for message in messages]
+                delay = self.retry_backoff * 2 ** attempt
+                time.sleep(delay / 2 + random.uniform(0, delay / 2))
 
-# Example usage
-# def send_token_email(to, token):
-#    subject = "Your One-Time Access Token"
-#    body = generate_token_email_body(token)
-#    return send_email(to, subject, body)
+    def send_many(self, messages):
+        """Send messages and return one DeliveryResult per message, in order."""
+        transport = self._transport()
+        batch_size = min(self.batch_size, transport.MAX_BATCH_SIZE)
+        batches = [messages[index:index + batch_size] for index in range(0, len(messages), batch_size)]
+        if len(batches) <= 1:
+            return [result for batch in batches for result in self._send_batch(transport, batch)]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            results = executor.map(lambda batch: self._send_batch(transport, batch), batches)
+            return [result for batch_results in results for result in batch_results]
+
+    def send(self, message):
+        return self.send_many([message])[0]
+
+def login_code_message(to, token):
+    return EmailMessage(
+        to=to,
+        subject=render('login_code.subject', token=token),
+        html_body=render('login_code.html', token=token),
+        tag='login-code'
+    )
+
+def send_email(to, otp):
+    """Email a one-time login code; returns the DeliveryResult."""
+    result = current_app.extensions['email_service'].send(login_code_message(to, otp))
+    if not result.ok:
+        logger.error("Error sending login code to %s: %s", to, result.error)
+    return result
@@ -0,0 +1,60 @@
+# app/email_service/templates.py
+
+from jinja2 import DictLoader, Environment, select_autoescape
+
+_LAYOUT = """\
+<html>
+<head>
+    <style>
+        .container { font-family: Arial, sans-serif; margin: 0 auto; padding: 20px; max-width: 600px;
+                     border: 1px solid #ddd; border-radius: 5px; background-color: #f9f9f9; }
+        .header { font-size: 24px; font-weight: bold; color: #333; margin-bottom: 20px; }
+        .body { font-size: 16px; color: #555; margin-bottom: 20px; }
+        .highlight { font-size: 20px; font-weight: bold; color: #007bff; margin: 20px 0; }
+        .footer { font-size: 14px; color: #999; margin-top: 30px; border-top: 1px solid #eee; padding-top: 10px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">{% block header %}{% endblock %}</div>
+        <div class="body">{% block body %}{% endblock %}</div>
+        <div class="footer">
+            <p>Thank you,</p>
+            <p>The Tech4Equity Team</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_SOURCES = {
+    'layout.html': _LAYOUT,
+    'login_code.html': """\
+{% extends 'layout.html' %}
+{% block header %}Your Superintendent App Login Code{% endblock %}
+{% block body %}
+<p>Hello,</p>
+<p>Here is your login code. Please copy/paste it to complete your login. It is valid for a limited time, so be sure to use it promptly.</p>
+<div class="highlight">{{ token }}</div>
+<p>If you did not request this code, please ignore this email or contact support if you have any concerns.</p>
+{% endblock %}
+""",
+    'login_code.subject': "{{ token }} is your Sup App login code",
+    'reminder.html': """\
+{% extends 'layout.html' %}
+{% block header %}Time for {{ title }}{% endblock %}
+{% block body %}
+<p>Hi {{ first_name }},</p>
+<p>Your activity is scheduled for <span class="highlight">{{ start }}</span>.</p>
+{% endblock %}
+""",
+    'reminder.subject': "Reminder: {{ title }} at {{ start }}",
+}
+
+_environment = Environment(loader=DictLoader(_SOURCES), autoescape=select_autoescape(['html']))
+
+# Compiled once at import; rendering is a plain function call per message
+TEMPLATES = {name: _environment.get_template(name) for name in _SOURCES if name != 'layout.html'}
+
+def render(name, **context):
+    return TEMPLATES[name].render(**context)
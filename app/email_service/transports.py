@@ -0,0 +1,96 @@
+# app/email_service/transports.py
+
+import threading
+import time
+from typing import NamedTuple, Optional
+
+class EmailMessage(NamedTuple):
+    to: str
+    subject: str
+    html_body: str
+    tag: Optional[str] = None
+
+class DeliveryResult(NamedTuple):
+    to: str
+    ok: bool
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    retryable: bool = False
+
+class TransientEmailError(Exception):
+    """The whole batch failed in a way worth retrying (throttling, 5xx, network)."""
+
+class PostmarkTransport:
+    """Sends batches through Postmark's /email/batch API over one pooled HTTP session."""
+
+    BATCH_URL = 'https://api.postmarkapp.com/email/batch'
+    MAX_BATCH_SIZE = 500
+
+    def __init__(self, server_token, sender, pool_size=4, timeout=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.sender = sender
+        self.timeout = timeout
+        self._requests = requests
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'X-Postmark-Server-Token': server_token,
+        })
+
+    def send_batch(self, messages):
+        payload = [
+            {'From': self.sender, 'To': message.to, 'Subject': message.subject,
+             'HtmlBody': message.html_body, **({'Tag': message.tag} if message.tag else {})}
+            for message in messages
+        ]
+        try:
+            response = self.session.post(self.BATCH_URL, json=payload, timeout=self.timeout)
+        except self._requests.RequestException as e:
+            raise TransientEmailError(str(e)) from e
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientEmailError(f"Postmark returned {response.status_code}")
+        response.raise_for_status()
+
+        return [
+            DeliveryResult(
+                to=message.to,
+                ok=result.get('ErrorCode') == 0,
+                message_id=result.get('MessageID'),
+                error=None if result.get('ErrorCode') == 0 else result.get('Message')
+            )
+            for message, result in zip(messages, response.json())
+        ]
+
+class FakeTransport:
+    """In-memory sink that records every message it accepts; for tests and local runs.
+
+    Accepts any message with a ``to`` field, so notification channels use it
+    too. ``fail_batches`` makes the next N ``send_batch`` calls raise
+    TransientEmailError, to exercise retries, and ``delay`` simulates a slow
+    provider.
+    """
+
+    MAX_BATCH_SIZE = 500
+
+    def __init__(self, fail_batches=0, delay=0):
+        self.outbox = []
+        self.batches = 0
+        self.fail_batches = fail_batches
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            self.batches += 1
+            if self.fail_batches:
+                self.fail_batches -= 1
+                raise TransientEmailError('fake transport failure')
+            self.outbox.extend(messages)
+            start = len(self.outbox) - len(messages)
+        return [DeliveryResult(message.to, True, message_id=f'fake-{start + index}') for index, message in enumerate(messages)]
@@ -4,8 +4,16 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_login import LoginManager
 from flask_restful import Api
+from app.cache import ScheduleCache
+from app.passwords import PasswordHasher
+from app.email_service import EmailService
+from app.channels import Channels
 
 db = SQLAlchemy()
 jwt = JWTManager()
 login_manager = LoginManager()
-api = Api()
\ No newline at end of file
+api = Api()
+schedule_cache = ScheduleCache()
+password_hasher = PasswordHasher()
+email_service = EmailService()
+notification_channels = Channels()
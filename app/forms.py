@@ -4,6 +4,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, IntegerField, TimeField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError
 from app.models import User, Activity
+from app.catalog import get_catalog
 from zoneinfo import ZoneInfo, available_timezones
 
 def get_timezone_choices():
@@ -49,4 +50,4 @@ class ScheduleActivityForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(ScheduleActivityForm, self).__init__(*args, **kwargs)
-        self.activity_id.choices = [(activity.id, activity.title) for activity in Activity.query.all()]
\ No newline at end of file
+        self.activity_id.choices = [(entry['id'], entry['title']) for entry in get_catalog()]
\ No newline at end of file
@@ -0,0 +1,58 @@
+# app/identity.py
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import select
+from app.extensions import db, schedule_cache
+from app.models import User
+from app.recurrence import get_zone
+
+class Identity(UserMixin):
+    """The User fields most requests need, loaded from the identity cache.
+
+    The login manager hands this out as ``current_user`` instead of a User row.
+    Views that show or change other columns load the row with
+    ``db.session.get(User, current_user.id)`` and call ``invalidate_identity``
+    after writing any of these fields.
+    """
+
+    def __init__(self, id, first_name, timezone, default_notifications):
+        self.id = id
+        self.first_name = first_name
+        self.timezone = timezone
+        self.default_notifications = default_notifications
+
+    @property
+    def zone(self):
+        return get_zone(self.timezone)
+
+    def get_id(self):
+        return str(self.id)
+
+def load_identity(user_id):
+    """Return the Identity for ``user_id``, or ``None`` if the user does not exist.
+
+    A hit needs no query. Entries live for IDENTITY_CACHE_TTL seconds and
+    ``invalidate_identity`` deletes them once its transaction commits: at
+    once everywhere with Redis, in this process only with the in-process
+    cache, where other workers catch up when the entry expires.
+    """
+    key = f'identity:{user_id}'
+    fields = schedule_cache.get(key)
+    if fields is None:
+        row = db.session.execute(
+            select(User.id, User.first_name, User.timezone, User.default_notifications).where(User.id == user_id)
+        ).one_or_none()
+        if row is None:
+            return None
+        fields = row._asdict()
+        schedule_cache.set(key, fields, ttl=current_app.config['IDENTITY_CACHE_TTL'])
+    return Identity(**fields)
+
+def invalidate_identity(user_id):
+    """Call before committing a change to any Identity field or to the user's roles.
+
+    Also retires the user's access tokens when the cache is shared; see ``api_identity``.
+    """
+    schedule_cache.bump(f'identity:{user_id}')
+    schedule_cache.discard(f'identity:{user_id}')
@@ -0,0 +1,160 @@
+# app/jobs.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from app.extensions import db
+from app.models import Job, ScheduleActivity
+from app.regeneration import regenerate_users
+from app.utils import schedule_zone, extend_activity_instances, reconcile_activity_instances
+
+JOB_HANDLERS = {}
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind; it receives the job payload."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+def enqueue(kind, payload=None, user_id=None):
+    """Queue a job and return it. With JOBS_RUN_INLINE the job runs before returning."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(kind=kind, payload=payload or {}, user_id=user_id, status='queued', attempts=0)
+    db.session.add(job)
+    db.session.commit()
+
+    if current_app.config.get('JOBS_RUN_INLINE'):
+        run_job(job.id)
+        db.session.refresh(job)
+    return job
+
+def _claimable(table, now):
+    stale = now - timedelta(seconds=current_app.config['JOBS_LEASE_SECONDS'])
+    return or_(
+        and_(table.c.status == 'queued', or_(table.c.next_attempt_at.is_(None), table.c.next_attempt_at <= now)),
+        and_(table.c.status == 'running', table.c.started_at < stale),
+    )
+
+def claim_jobs(limit, now=None):
+    """Atomically mark up to ``limit`` claimable jobs as running and return their ids.
+
+    Queued jobs are claimable once their retry backoff has passed, and
+    running jobs once their lease of JOBS_LEASE_SECONDS from ``started_at``
+    has run out, so a job whose worker died is picked up again. Stale jobs
+    that already used JOBS_MAX_ATTEMPTS are failed instead. On PostgreSQL the
+    candidates are locked with FOR UPDATE SKIP LOCKED, so concurrent workers
+    never wait on each other. SQLite ignores the lock clause; there the
+    conditional UPDATE decides which worker wins a job.
+    """
+    now = now or datetime.now(timezone.utc)
+    table = Job.__table__
+    db.session.execute(
+        update(table)
+        .where(_claimable(table, now), table.c.status == 'running',
+               table.c.attempts >= current_app.config['JOBS_MAX_ATTEMPTS'])
+        .values(status='failed', error='Lease expired', finished_at=now)
+    )
+
+    candidates = select(table.c.id).where(_claimable(table, now)).order_by(table.c.id).limit(limit)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    job_ids = db.session.execute(candidates).scalars().all()
+    if not job_ids:
+        db.session.commit()
+        return []
+
+    claimed = db.session.execute(
+        update(table)
+        .where(table.c.id.in_(job_ids), _claimable(table, now))
+        .values(status='running', attempts=table.c.attempts + 1, started_at=now)
+        .returning(table.c.id)
+    ).scalars().all()
+    db.session.commit()
+    return sorted(claimed)
+
+def _summary(error, limit=200):
+    first_line = (str(error).splitlines() or [''])[0]
+    return f'{type(error).__name__}: {first_line}'[:limit]
+
+def run_job(job_id):
+    """Run a claimed (or inline) job and record its result or error.
+
+    A claimed job that raises is queued again with exponential backoff from
+    JOBS_RETRY_SECONDS until it has used JOBS_MAX_ATTEMPTS, then marked
+    ``failed``. Inline jobs are not retried.
+    """
+    job = db.session.get(Job, job_id)
+    try:
+        job.result = JOB_HANDLERS[job.kind](job.payload)
+        job.status = 'done'
+        job.error = None
+    except Exception as e:
+        # The traceback stays in the server log; the job keeps a one-line summary its owner may see
+        current_app.logger.exception("Job %s (%s) failed on attempt %s", job_id, job.kind, job.attempts)
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.error = _summary(e)
+        config = current_app.config
+        if 0 < job.attempts < config['JOBS_MAX_ATTEMPTS']:
+            job.status = 'queued'
+            job.next_attempt_at = datetime.now(timezone.utc) + timedelta(
+                seconds=config['JOBS_RETRY_SECONDS'] * 2 ** (job.attempts - 1)
+            )
+            db.session.commit()
+            return job.status
+        job.status = 'failed'
+    job.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+    return job.status
+
+def _run_in_context(app, job_id):
+    with app.app_context():
+        return run_job(job_id)
+
+def work(app, concurrency=4, poll_interval=1.0, burst=False):
+    """Claim and run jobs on a thread pool until interrupted.
+
+    With ``burst`` the loop exits once the queue is empty. Returns the number
+    of jobs run.
+    """
+    processed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            with app.app_context():
+                job_ids = claim_jobs(concurrency)
+            if not job_ids:
+                if burst:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            # Wait for the batch so at most `concurrency` jobs are claimed at a time
+            list(executor.map(lambda job_id: _run_in_context(app, job_id), job_ids))
+            processed += len(job_ids)
+
+@job_handler('regenerate_user')
+def _regenerate_user(payload):
+    return regenerate_users([payload['user_id']])
+
+@job_handler('extend_activity')
+def _extend_activity(payload):
+    schedule_activity = db.session.get(ScheduleActivity, payload['schedule_activity_id'])
+    if schedule_activity is None:
+        return {'inserted': 0}
+    config = current_app.config
+    horizon_end = datetime.now(timezone.utc) + timedelta(days=config['INSTANCE_HORIZON_DAYS'])
+    inserted = extend_activity_instances(
+        schedule_activity, schedule_zone(schedule_activity), horizon_end, config['INSTANCE_CHUNK_DAYS']
+    )
+    return {'inserted': inserted}
+
+@job_handler('reconcile_activity')
+def _reconcile_activity(payload):
+    schedule_activity = db.session.get(ScheduleActivity, payload['schedule_activity_id'])
+    if schedule_activity is None:
+        return {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    return reconcile_activity_instances(schedule_activity, sync_notifications=payload.get('sync_notifications', False))
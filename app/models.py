@@ -1,13 +1,13 @@
 # app/models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, Date, Time, text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, Date, Time, JSON, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.ext.associationproxy import association_proxy
 from typing import List, Optional
 from datetime import date, time, datetime, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from app.extensions import db
+from app.extensions import db, password_hasher
+from app.recurrence import get_zone
 from zoneinfo import ZoneInfo
 
 class Base(db.Model):
@@ -46,10 +46,22 @@ class User(Base, UserMixin):
     )
 
     def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        """Verify a password, upgrading the stored hash if the configured method changed.
+
+        The caller commits; a rehash leaves the user modified in the session.
+        """
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.password_hash = password_hasher.hash(password)
+        return True
+
+    @property
+    def zone(self):
+        return get_zone(self.timezone)
 
     def get_id(self):
         return str(self.id)
@@ -167,6 +179,7 @@ class ScheduleActivity(db.Model):
     duration: Mapped[int] = mapped_column(Integer, nullable=False)
     recurrence: Mapped[str] = mapped_column(String, nullable=False)
     generate_notifications: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    materialized_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))  # Instances exist up to here (UTC)
 
     schedule: Mapped["Schedule"] = relationship(back_populates="schedule_activities")
     activity: Mapped["Activity"] = relationship()
@@ -184,6 +197,9 @@ class ScheduleActivity(db.Model):
 
 class ActivityShare(Base):
     __tablename__ = 'activity_shares'
+    __table_args__ = (
+        db.Index('ix_activity_shares_user_id_activity_id', 'user_id', 'activity_id'),
+    )
 
     id = mapped_column(Integer, primary_key=True)
     activity_id = mapped_column(ForeignKey('activities.id'), nullable=False)
@@ -195,6 +211,9 @@ class ActivityShare(Base):
 
 class ScheduleShare(Base):
     __tablename__ = 'schedule_shares'
+    __table_args__ = (
+        db.Index('ix_schedule_shares_user_id_schedule_id', 'user_id', 'schedule_id'),
+    )
 
     id = mapped_column(Integer, primary_key=True)
     schedule_id = mapped_column(ForeignKey('schedules.id'), nullable=False)
@@ -209,10 +228,18 @@ class ActivityInstance(db.Model):
     __tablename__ = "activity_instances"
     __table_args__ = (
         db.UniqueConstraint('schedule_activity_id', 'instance_date', name='unique_activity_instance'),
+        db.Index('ix_activity_instances_user_id_instance_date', 'user_id', 'instance_date'),
+        # Pending reminders only; the notification dispatcher range-scans this
+        db.Index(
+            'ix_activity_instances_due', 'instance_date',
+            postgresql_where=text('generate_notifications AND NOT completed'),
+            sqlite_where=text('generate_notifications AND NOT completed')
+        ),
     )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     schedule_activity_id: Mapped[int] = mapped_column(ForeignKey("schedule_activities.id"))
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"))  # Denormalized from Schedule.user_id
     instance_date: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     completed: Mapped[bool] = mapped_column(Boolean, default=False)
     completion_date: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
@@ -222,6 +249,27 @@ class ActivityInstance(db.Model):
     
     schedule_activity: Mapped["ScheduleActivity"] = relationship(back_populates="instances")
 
+class DailyAdherence(db.Model):
+    """Per-day rollup of a user's stored instances, by category, on the user's local calendar.
+
+    Maintained incrementally by app.adherence; ``backfill-adherence`` rebuilds it.
+    """
+    __tablename__ = "daily_adherence"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    local_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"), primary_key=True)
+    scheduled: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    notifications: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # Instances with notifications on
+
+class CacheVersion(db.Model):
+    """Named version counter behind the schedule cache keys and ETags; see app.cache.ScheduleCache."""
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
 class CoachClient(Base):
     __tablename__ = "coach_clients"
     
@@ -233,14 +281,53 @@ class CoachClient(Base):
     client: Mapped["User"] = relationship(foreign_keys=[client_id])
 
 class Notification(Base):
+    """Outbox row for one reminder on one channel.
+
+    Rows are written ``pending`` and claimed by sender workers, which push
+    ``next_attempt_at`` out by a lease while they deliver; a worker that dies
+    mid-batch leaves its rows to be claimed again once the lease expires.
+    """
     __tablename__ = "notifications"
+    __table_args__ = (
+        db.UniqueConstraint('schedule_activity_id', 'due_at', 'notification_type', name='unique_notification'),
+        # Pending rows only; sender workers claim each channel in next_attempt_at order
+        db.Index(
+            'ix_notifications_pending_channel', 'notification_type', 'next_attempt_at',
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'")
+        ),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     schedule_activity_id: Mapped[int] = mapped_column(ForeignKey("schedule_activities.id"))
-    notification_time: Mapped[time] = mapped_column(Time)
-    notification_type: Mapped[str] = mapped_column(String(20))  # SMS, email, or app notification
-    sent: Mapped[bool] = mapped_column(Boolean, default=False)
+    activity_instance_id: Mapped[Optional[int]] = mapped_column(Integer)  # Not a foreign key; instances are regenerated freely
+    due_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)  # Instance time (UTC)
+    notification_type: Mapped[str] = mapped_column(String(20))  # Channel: email, sms, push or log
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='pending')  # pending, sent or failed
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
     
     user: Mapped["User"] = relationship()
-    schedule_activity: Mapped["ScheduleActivity"] = relationship()
\ No newline at end of file
+    schedule_activity: Mapped["ScheduleActivity"] = relationship()
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"))  # Who may poll the job
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='queued')  # queued, running, done or failed
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    result: Mapped[Optional[dict]] = mapped_column(JSON)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))  # Start of the running attempt's lease
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))  # Retry backoff; None runs at once
@@ -0,0 +1,354 @@
+# app/notifications.py
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone, timedelta
+from typing import NamedTuple
+from flask import current_app
+from sqlalchemy import select
+from app.email_service import EmailMessage, render
+from app import outbox
+from app.channels import PushMessage, SendOutcome, SmsMessage
+from app.extensions import db, notification_channels
+from app.models import ActivityInstance, ScheduleActivity, Activity, User
+from app.recurrence import get_zone
+from app.utils import _as_utc
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_SENDERS = {}
+CHANNEL_LOADERS = {}
+CHANNEL_CONTACTS = {}
+
+def channel_sender(channel, load=None, contact=None):
+    """Register a function as the sender for a channel.
+
+    The sender receives a list of Reminders and may return a SendOutcome
+    naming the ones it did not deliver; failed reminders are retried through
+    the outbox with backoff, deferred ones after ``retry_after`` seconds.
+    Senders run on a thread of their own and must not use the database:
+    ``load``, if given, is called with the Reminders on the delivering thread
+    and its result is passed to the sender as a second argument.
+    ``contact`` is the User column a recipient needs filled in to be
+    reminded on this channel; users without it are skipped by the Dispatcher.
+    """
+    def decorator(func):
+        CHANNEL_SENDERS[channel] = func
+        if load is not None:
+            CHANNEL_LOADERS[channel] = load
+        if contact is not None:
+            CHANNEL_CONTACTS[channel] = contact
+        return func
+    return decorator
+
+class Reminder(NamedTuple):
+    instance_id: int
+    user_id: int
+    schedule_activity_id: int
+    due_at: datetime
+    channel: str
+
+class TimingWheel:
+    """A ring of ``tick_seconds`` slots covering ``horizon_seconds`` from the current slot.
+
+    ``add`` drops an item into the slot of its due time (overdue items go into
+    the earliest slot not yet popped) and ``pop_due`` returns everything in
+    the slots that have started, in due order.
+    """
+
+    def __init__(self, tick_seconds, horizon_seconds):
+        self.tick_seconds = tick_seconds
+        self._slots = [[] for _ in range(int(horizon_seconds // tick_seconds) + 2)]
+        self._cursor = None
+        self._count = 0
+
+    def _slot(self, moment):
+        return int(moment.timestamp() // self.tick_seconds)
+
+    def add(self, due_at, item):
+        """Schedule ``item``; returns False if ``due_at`` lies beyond the wheel."""
+        slot = self._slot(due_at)
+        if self._cursor is None:
+            self._cursor = slot
+        slot = max(slot, self._cursor)
+        if slot - self._cursor >= len(self._slots):
+            return False
+        self._slots[slot % len(self._slots)].append((due_at, item))
+        self._count += 1
+        return True
+
+    def pop_due(self, now):
+        current = self._slot(now)
+        if self._cursor is None:
+            self._cursor = current
+        due = []
+        # An idle gap longer than the ring only needs one lap
+        start = max(self._cursor, current - len(self._slots) + 1)
+        for slot in range(start, current + 1):
+            bucket = self._slots[slot % len(self._slots)]
+            due.extend(sorted(bucket, key=lambda entry: entry[0]))
+            bucket.clear()
+        self._cursor = current + 1
+        self._count -= len(due)
+        return [item for _, item in due]
+
+    def __len__(self):
+        return self._count
+
+class Dispatcher:
+    """Loads due reminders into a timing wheel and hands them to channel senders.
+
+    Each tick reads only the slice of time that entered the lookahead window
+    since the previous tick, through the partial index on pending instances.
+    Every ``refresh_seconds`` the whole window is read again, so rows
+    materialized or toggled on after their slice was loaded are not missed.
+    Each instance is queued once per channel in NOTIFICATION_CHANNELS (or
+    ``channels``) that its user has contact details for, and each becomes its
+    own outbox row. Just before sending, each batch is re-checked in one
+    query and rows that were completed, switched off or moved are dropped;
+    the rest are written to the notification outbox. With ``deliver`` the dispatcher also drains
+    the outbox itself, otherwise ``deliver-notifications`` workers do.
+    """
+
+    def __init__(self, tick_seconds=10, lookahead_minutes=10, batch_size=500, refresh_seconds=300, channels=None,
+                 deliver=True):
+        self.tick_seconds = tick_seconds
+        self.lookahead = timedelta(minutes=lookahead_minutes)
+        self.batch_size = batch_size
+        self.refresh_seconds = refresh_seconds
+        self.channels = list(channels or current_app.config['NOTIFICATION_CHANNELS'])
+        self.deliver = deliver
+        self.wheel = TimingWheel(tick_seconds, self.lookahead.total_seconds())
+        self._loaded_until = None
+        self._refreshed_at = None
+        # instance id -> due time of every reminder queued or sent in the window
+        self._seen = {}
+
+    def _pending(self):
+        table = ActivityInstance.__table__
+        return table, (table.c.generate_notifications, ~table.c.completed)
+
+    def load(self, start, end):
+        """Queue the reminders due in ``[start, end)``; returns how many were added."""
+        table, pending = self._pending()
+        contacts = {name: CHANNEL_CONTACTS[name] for name in self.channels if name in CHANNEL_CONTACTS}
+        query = select(
+            table.c.id, table.c.user_id, table.c.schedule_activity_id, table.c.instance_date,
+            *(column.label(name) for name, column in contacts.items())
+        )
+        if contacts:
+            query = query.join(User, User.id == table.c.user_id)
+        rows = db.session.execute(
+            query.where(*pending, table.c.instance_date >= start, table.c.instance_date < end)
+            .order_by(table.c.instance_date)
+        ).all()
+        db.session.commit()
+
+        added = 0
+        for row in rows:
+            due_at = _as_utc(row.instance_date)
+            if self._seen.get(row.id) == due_at:
+                continue
+            reminders = [
+                Reminder(row.id, row.user_id, row.schedule_activity_id, due_at, name)
+                for name in self.channels if name not in contacts or row._mapping[name]
+            ]
+            # Every reminder of an instance shares its due time, so they all fit the wheel or none does
+            if not all(self.wheel.add(due_at, reminder) for reminder in reminders):
+                continue
+            self._seen[row.id] = due_at
+            added += len(reminders)
+        return added
+
+    def _still_due(self, reminders):
+        table, pending = self._pending()
+        current = dict(db.session.execute(
+            select(table.c.id, table.c.instance_date)
+            .where(*pending, table.c.id.in_([reminder.instance_id for reminder in reminders]))
+        ).all())
+        db.session.commit()
+        return [
+            reminder for reminder in reminders
+            if reminder.instance_id in current and _as_utc(current[reminder.instance_id]) == reminder.due_at
+        ]
+
+    def send(self, reminders, now):
+        """Re-check reminders and enqueue them in the outbox; returns the number delivered by this call."""
+        for index in range(0, len(reminders), self.batch_size):
+            outbox.enqueue(self._still_due(reminders[index:index + self.batch_size]), now)
+        return deliver(now, self.batch_size) if self.deliver else 0
+
+    def tick(self, now=None):
+        """Load newly visible reminders, send the ones due by ``now`` and return how many were sent."""
+        now = now or datetime.now(timezone.utc)
+        horizon = now + self.lookahead
+
+        if self._refreshed_at is None or (now - self._refreshed_at).total_seconds() >= self.refresh_seconds:
+            self.load(now, horizon)
+            self._loaded_until = horizon
+            self._refreshed_at = now
+        elif horizon > self._loaded_until:
+            self.load(self._loaded_until, horizon)
+            self._loaded_until = horizon
+
+        sent = self.send(self.wheel.pop_due(now), now)
+
+        # Reminders that are due well in the past can no longer be reloaded
+        cutoff = now - timedelta(seconds=2 * self.tick_seconds)
+        self._seen = {instance_id: due_at for instance_id, due_at in self._seen.items() if due_at >= cutoff}
+        return sent
+
+    def run(self, once=False):
+        while True:
+            started = time.monotonic()
+            sent = self.tick()
+            if sent:
+                logger.info("Dispatched %d reminders (%d queued)", sent, len(self.wheel))
+            if once:
+                return sent
+            time.sleep(max(0.0, self.tick_seconds - (time.monotonic() - started)))
+
+def _send(app, sender, args):
+    with app.app_context():
+        return sender(*args)
+
+def _settle(rows, reminders, future, now):
+    """Record the outcome of one sent batch.
+
+    Returns the number of reminders delivered and whether the channel
+    deferred any of them, i.e. its bucket or breaker turned items away.
+    """
+    try:
+        outcome = future.result() or SendOutcome()
+        error = 'rejected by sender'
+    except Exception as e:
+        logger.error("Sending %d reminders on %s failed: %s", len(reminders), reminders[0].channel, e)
+        outcome, error = SendOutcome(failed=tuple(reminders)), str(e)
+
+    sent_ids, failures, deferrals = [], [], []
+    failed, deferred = set(outcome.failed), set(outcome.deferred)
+    for row, reminder in zip(rows, reminders):
+        if reminder in deferred:
+            deferrals.append((row.id, outcome.retry_after or 1.0))
+        elif reminder in failed:
+            failures.append((row.id, row.attempts, error))
+        else:
+            sent_ids.append(row.id)
+
+    delivered = outbox.mark_sent(sent_ids, now)
+    outbox.mark_failed(failures, now)
+    outbox.defer(deferrals, now)
+    return delivered, bool(deferrals)
+
+def _accepting(name):
+    """Whether the channel behind ``name`` would take a batch right now."""
+    try:
+        channel = notification_channels[name]
+    except KeyError:
+        # Senders without a Channel, like the log sender, are never throttled
+        return True
+    return channel.breaker.state != 'open' and channel.bucket.wait_time() == 0
+
+def deliver(now=None, batch_size=500, channel=None):
+    """Drain the outbox rows due by ``now``, of every channel or only ``channel``.
+
+    Each channel runs its own claim, send and mark cycle: its next batch is
+    claimed as soon as its previous one has been sent, so a slow or throttled
+    provider holds up only its own rows while the other channels keep going.
+    A channel that defers any of a batch, or whose breaker is open or bucket
+    empty, is not claimed again until the next pass. Sends run on a thread per channel; claiming, loading and marking stay on
+    the calling thread. Every batch ends in one UPDATE for the rows sent and
+    one executemany each for the rows to retry and to defer. Returns the
+    number of reminders delivered once every channel has run dry or been held.
+    """
+    now = now or datetime.now(timezone.utc)
+    channels = [channel] if channel is not None else outbox.due_channels(now)
+    if not channels:
+        return 0
+    app = current_app._get_current_object()
+    in_flight = {}
+    delivered = 0
+
+    with ThreadPoolExecutor(max_workers=len(channels)) as executor:
+        def submit(name):
+            rows = outbox.claim(batch_size, now, channel=name)
+            if not rows:
+                return
+            reminders = [
+                Reminder(row.activity_instance_id, row.user_id, row.schedule_activity_id, _as_utc(row.due_at), name)
+                for row in rows
+            ]
+            try:
+                if name not in CHANNEL_SENDERS:
+                    raise LookupError(f"No sender registered for channel {name!r}")
+                load = CHANNEL_LOADERS.get(name)
+                args = (reminders, load(reminders)) if load else (reminders,)
+                future = executor.submit(_send, app, CHANNEL_SENDERS[name], args)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            in_flight[future] = (name, rows, reminders)
+
+        for name in channels:
+            submit(name)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, rows, reminders = in_flight.pop(future)
+                sent, held = _settle(rows, reminders, future, now)
+                delivered += sent
+                if len(rows) == batch_size and not held and _accepting(name):
+                    submit(name)
+    return delivered
+
+@channel_sender('log')
+def _log_sender(reminders):
+    for reminder in reminders:
+        logger.info("Reminder for user %s: instance %s due at %s",
+                    reminder.user_id, reminder.instance_id, reminder.due_at.isoformat())
+
+def _reminder_contexts(reminders):
+    """Return the recipient and template context of each reminder, loaded in two queries."""
+    titles = dict(db.session.execute(
+        select(ScheduleActivity.id, Activity.title)
+        .join(Activity, ScheduleActivity.activity_id == Activity.id)
+        .where(ScheduleActivity.id.in_({reminder.schedule_activity_id for reminder in reminders}))
+    ).all())
+    users = {
+        row.id: row
+        for row in db.session.execute(
+            select(User.id, User.email, User.mobile, User.first_name, User.timezone)
+            .where(User.id.in_({reminder.user_id for reminder in reminders}))
+        ).all()
+    }
+    db.session.commit()
+
+    contexts = []
+    for reminder in reminders:
+        user = users[reminder.user_id]
+        start = reminder.due_at.astimezone(get_zone(user.timezone or 'UTC')).strftime('%I:%M %p')
+        contexts.append((user, {'title': titles[reminder.schedule_activity_id], 'first_name': user.first_name, 'start': start}))
+    return contexts
+
+@channel_sender('email', load=_reminder_contexts, contact=User.email)
+def _email_sender(reminders, contexts):
+    """Render one reminder email per instance and send them through the email channel."""
+    return notification_channels['email'].send([
+        (reminder, EmailMessage(user.email, render('reminder.subject', **context), render('reminder.html', **context), tag='reminder'))
+        for reminder, (user, context) in zip(reminders, contexts)
+    ])
+
+@channel_sender('sms', load=_reminder_contexts, contact=User.mobile)
+def _sms_sender(reminders, contexts):
+    return notification_channels['sms'].send([
+        (reminder, SmsMessage(user.mobile, render('reminder.subject', **context)))
+        for reminder, (user, context) in zip(reminders, contexts)
+    ])
+
+@channel_sender('push', load=_reminder_contexts)
+def _push_sender(reminders, contexts):
+    return notification_channels['push'].send([
+        (reminder, PushMessage(reminder.user_id, context['title'], render('reminder.subject', **context)))
+        for reminder, (user, context) in zip(reminders, contexts)
+    ])
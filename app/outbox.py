@@ -0,0 +1,140 @@
+# app/outbox.py
+
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import Notification
+
+_table = Notification.__table__
+
+DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def enqueue(reminders, now):
+    """Write a pending outbox row per reminder and return the ids of the rows added.
+
+    Reminders already in the outbox (same schedule activity, due time and
+    channel) are skipped by the unique key, so overlapping dispatchers can
+    enqueue the same window without producing duplicates.
+    """
+    if not reminders:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    statement = DIALECT_INSERTS[dialect](_table).on_conflict_do_nothing(
+        index_elements=['schedule_activity_id', 'due_at', 'notification_type']
+    ).returning(_table.c.id)
+    added = db.session.execute(statement, [
+        {
+            'user_id': reminder.user_id,
+            'schedule_activity_id': reminder.schedule_activity_id,
+            'activity_instance_id': reminder.instance_id,
+            'due_at': reminder.due_at,
+            'notification_type': reminder.channel,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': max(reminder.due_at, now),
+        }
+        for reminder in reminders
+    ]).scalars().all()
+    db.session.commit()
+    return added
+
+def due_channels(now):
+    """Return the channels that have pending rows due by ``now``."""
+    rows = db.session.execute(
+        select(_table.c.notification_type).distinct()
+        .where(_table.c.status == 'pending', _table.c.next_attempt_at <= now)
+    ).scalars().all()
+    db.session.commit()
+    return sorted(rows)
+
+def claim(limit, now, channel=None):
+    """Lease up to ``limit`` pending rows that are due by ``now``, optionally of one channel, and return them.
+
+    As with jobs, PostgreSQL locks the candidates with FOR UPDATE SKIP LOCKED
+    and the conditional UPDATE settles races elsewhere. Claiming counts an
+    attempt and moves ``next_attempt_at`` past OUTBOX_LEASE_SECONDS, so the
+    rows are invisible to other workers until marked or the lease runs out.
+    """
+    candidates = select(_table.c.id).where(
+        _table.c.status == 'pending', _table.c.next_attempt_at <= now
+    ).order_by(_table.c.next_attempt_at).limit(limit)
+    if channel is not None:
+        candidates = candidates.where(_table.c.notification_type == channel)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    ids = db.session.execute(candidates).scalars().all()
+    if not ids:
+        db.session.commit()
+        return []
+
+    rows = db.session.execute(
+        update(_table)
+        .where(_table.c.id.in_(ids), _table.c.status == 'pending', _table.c.next_attempt_at <= now)
+        .values(
+            attempts=_table.c.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])
+        )
+        .returning(
+            _table.c.id, _table.c.user_id, _table.c.schedule_activity_id, _table.c.activity_instance_id,
+            _table.c.due_at, _table.c.notification_type, _table.c.attempts
+        )
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+def mark_sent(ids, now):
+    """Mark claimed rows sent in one UPDATE; rows already settled are left alone."""
+    if not ids:
+        return 0
+    result = db.session.execute(
+        update(_table)
+        .where(_table.c.id.in_(ids), _table.c.status == 'pending')
+        .values(status='sent', sent_at=now, last_error=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def mark_failed(failures, now):
+    """Schedule retries for ``(id, attempts, error)`` failures, or fail them for good.
+
+    Retries back off exponentially from OUTBOX_RETRY_SECONDS; a row that has
+    used OUTBOX_MAX_ATTEMPTS is marked ``failed``. All rows go in one
+    executemany.
+    """
+    if not failures:
+        return
+    config = current_app.config
+    db.session.execute(
+        update(_table)
+        .where(_table.c.id == bindparam('b_id'), _table.c.status == 'pending')
+        .values(status=bindparam('b_status'), next_attempt_at=bindparam('b_next'), last_error=bindparam('b_error')),
+        [
+            {
+                'b_id': row_id,
+                'b_status': 'failed' if attempts >= config['OUTBOX_MAX_ATTEMPTS'] else 'pending',
+                'b_next': now + timedelta(seconds=config['OUTBOX_RETRY_SECONDS'] * 2 ** (attempts - 1)),
+                'b_error': error,
+            }
+            for row_id, attempts, error in failures
+        ]
+    )
+    db.session.commit()
+
+def defer(deferrals, now):
+    """Hand ``(id, seconds)`` rows back without spending an attempt, due again ``seconds`` from ``now``.
+
+    Used when a channel is throttled or its circuit is open rather than
+    when delivery failed.
+    """
+    if not deferrals:
+        return
+    db.session.execute(
+        update(_table)
+        .where(_table.c.id == bindparam('b_id'), _table.c.status == 'pending')
+        .values(attempts=_table.c.attempts - 1, next_attempt_at=bindparam('b_next')),
+        [{'b_id': row_id, 'b_next': now + timedelta(seconds=seconds)} for row_id, seconds in deferrals]
+    )
+    db.session.commit()
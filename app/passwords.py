@@ -0,0 +1,93 @@
+# app/passwords.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """Raised when the hashing queue is full; renders as 503 with a Retry-After header."""
+    description = 'Too many sign-ins at once. Please try again in a moment.'
+
+    def __init__(self):
+        super().__init__(retry_after=1)
+
+class PasswordHasher:
+    """Runs password hashing on a bounded thread pool.
+
+    hashlib releases the GIL while deriving keys, so at most
+    PASSWORD_HASH_WORKERS hashes run at once without blocking the request
+    threads' Python work. Up to PASSWORD_HASH_MAX_QUEUE more wait for a
+    thread; beyond that PasswordHasherBusy is raised instead of queueing.
+    PASSWORD_HASH_METHOD is any werkzeug method string, e.g. ``scrypt`` or
+    ``pbkdf2:sha256:600000``; hashes made with other parameters are reported
+    by ``needs_rehash``.
+    """
+
+    def __init__(self, app=None):
+        self.method = None
+        self._executor = None
+        self._slots = None
+        self._method_prefix = None
+        self._lock = threading.Lock()
+        self._metrics = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_MAX_QUEUE', 16)
+
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self._method_prefix = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_MAX_QUEUE'])
+        self._metrics = {
+            'hash': {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0},
+            'verify': {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0},
+            'rejected': 0,
+        }
+        app.extensions['password_hasher'] = self
+
+    def _run(self, operation, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._metrics['rejected'] += 1
+            raise PasswordHasherBusy()
+        started = time.perf_counter()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                metrics = self._metrics[operation]
+                metrics['count'] += 1
+                metrics['seconds'] += elapsed
+                metrics['max_seconds'] = max(metrics['max_seconds'], elapsed)
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Return True if ``password_hash`` was made with a different method or cost."""
+        if self._method_prefix is None:
+            # werkzeug fills in default parameters; read them off a throwaway hash
+            self._method_prefix = self.hash('').split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self):
+        """Return call counts and wall-clock timings (queue wait included) per operation."""
+        with self._lock:
+            stats = {operation: dict(values) if isinstance(values, dict) else values
+                     for operation, values in self._metrics.items()}
+        for operation in ('hash', 'verify'):
+            count = stats[operation]['count']
+            stats[operation]['mean_seconds'] = stats[operation]['seconds'] / count if count else 0.0
+        return stats
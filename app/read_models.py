@@ -0,0 +1,95 @@
+# app/read_models.py
+
+from datetime import datetime, time, timezone
+from typing import NamedTuple
+from sqlalchemy import select
+from app.extensions import db, schedule_cache
+from app.models import Activity, ActivityInstance, Schedule, ScheduleActivity
+from app.utils import _as_utc, expand_instance_rows
+
+class DayRow(NamedTuple):
+    """One line of the home page schedule, with times already in the user's timezone."""
+    id: int | None
+    schedule_activity_id: int
+    date: str
+    start_time: str
+    time_display: str
+    title: str
+    duration: int
+    completed: bool
+
+def _day_row(schedule_activity, instance_id, instance_date, completed, local_date, user_tz):
+    instance_date_local = _as_utc(instance_date).astimezone(user_tz)
+    return DayRow(
+        id=instance_id,
+        schedule_activity_id=schedule_activity.id,
+        date=local_date.isoformat(),
+        start_time=instance_date_local.strftime('%H:%M'),
+        time_display=instance_date_local.strftime('%I:%M %p'),
+        title=schedule_activity.title,
+        duration=schedule_activity.duration,
+        completed=bool(completed),
+    )
+
+def load_day_rows(user_id, local_date, user_tz):
+    """Build the DayRows for one local date from two column-only selects.
+
+    A stored instance takes the place of its occurrence. Rows are ordered by
+    the moment they happen, stored and projected alike, so an instance moved
+    away from its activity's ``start_time`` is listed at its own time.
+    """
+    start_local = datetime.combine(local_date, time.min, tzinfo=user_tz)
+    end_local = datetime.combine(local_date, time.max, tzinfo=user_tz)
+
+    schedule_activities = db.session.execute(
+        select(
+            ScheduleActivity.id, ScheduleActivity.recurrence, ScheduleActivity.dtstart,
+            ScheduleActivity.start_time, ScheduleActivity.duration,
+            ScheduleActivity.generate_notifications, Activity.title
+        )
+        .join(Schedule, ScheduleActivity.schedule_id == Schedule.id)
+        .join(Activity, ScheduleActivity.activity_id == Activity.id)
+        .where(Schedule.user_id == user_id)
+        .order_by(ScheduleActivity.id)
+    ).all()
+
+    stored = {
+        row.schedule_activity_id: row
+        for row in db.session.execute(
+            select(
+                ActivityInstance.id, ActivityInstance.schedule_activity_id,
+                ActivityInstance.instance_date, ActivityInstance.completed
+            )
+            .where(
+                ActivityInstance.user_id == user_id,
+                ActivityInstance.instance_date >= start_local.astimezone(timezone.utc),
+                ActivityInstance.instance_date <= end_local.astimezone(timezone.utc)
+            )
+        )
+    }
+
+    timed = []
+    for schedule_activity in schedule_activities:
+        instance = stored.get(schedule_activity.id)
+        if instance is not None:
+            timed.append((_as_utc(instance.instance_date), schedule_activity.id, _day_row(
+                schedule_activity, instance.id, instance.instance_date, instance.completed, local_date, user_tz
+            )))
+            continue
+        # The projected row carries the columns expand_instance_rows reads
+        for _, instance_date, _ in expand_instance_rows(schedule_activity, user_tz, start_local, end_local):
+            timed.append((_as_utc(instance_date), schedule_activity.id,
+                          _day_row(schedule_activity, None, instance_date, False, local_date, user_tz)))
+    timed.sort(key=lambda entry: entry[:2])
+    return [row for _, _, row in timed]
+
+def get_day_view(user_id, local_date, user_tz):
+    """Return the user's DayRows for one local date, served from ``schedule_cache`` when possible."""
+    cached = schedule_cache.get_day(user_id, user_tz.key, local_date)
+    if cached is not None:
+        # Shared backends hand back JSON arrays; rebuild the named rows
+        return [DayRow(*values) for values in cached]
+
+    rows = load_day_rows(user_id, local_date, user_tz)
+    schedule_cache.set_day(user_id, user_tz.key, local_date, rows)
+    return rows
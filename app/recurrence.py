@@ -0,0 +1,147 @@
+# app/recurrence.py
+
+from datetime import datetime, date, time, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from dateutil.rrule import rrulestr
+
+RULE_CACHE_SIZE = 1024
+OCCURRENCE_CACHE_SIZE = 8192
+
+WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    return ZoneInfo(name)
+
+def normalize_rule(rule_text):
+    """Return a canonical form of a single-line RRULE so equivalent rules share a cache entry."""
+    rule = rule_text.strip()
+    if '\n' in rule or 'DTSTART' in rule.upper():
+        return rule
+    rule = rule.upper()
+    if rule.startswith('RRULE:'):
+        rule = rule[len('RRULE:'):]
+    return ';'.join(sorted(part for part in rule.split(';') if part))
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def _compile_rule(rule, dtstart_utc, tz_name):
+    return rrulestr(rule, dtstart=dtstart_utc.astimezone(get_zone(tz_name)))
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def _simple_rule(rule):
+    """Return ``(freq, interval, weekdays)`` for rules the fast expander handles, else ``None``.
+
+    Covers the shapes ScheduleActivityForm offers: FREQ=DAILY and FREQ=WEEKLY with
+    optional INTERVAL and plain BYDAY weekdays. Anything else goes through dateutil.
+    """
+    try:
+        parts = dict(part.split('=', 1) for part in rule.split(';'))
+    except ValueError:
+        return None
+    freq = parts.pop('FREQ', None)
+    if freq not in ('DAILY', 'WEEKLY'):
+        return None
+    interval = parts.pop('INTERVAL', '1')
+    byday = parts.pop('BYDAY', None)
+    if parts or not interval.isdigit() or int(interval) < 1:
+        return None
+    weekdays = None
+    if byday is not None:
+        if any(day not in WEEKDAYS for day in byday.split(',')):
+            return None
+        weekdays = frozenset(WEEKDAYS[day] for day in byday.split(','))
+    return freq, int(interval), weekdays
+
+def _expand_simple(freq, interval, weekdays, dtstart_date, start_date, end_date):
+    first = max(start_date, dtstart_date).toordinal()
+    last = end_date.toordinal()
+    anchor = dtstart_date.toordinal()
+    if first > last:
+        return ()
+
+    if freq == 'DAILY':
+        ordinals = range(first + (anchor - first) % interval, last + 1, interval)
+        if weekdays is not None:
+            ordinals = [ordinal for ordinal in ordinals if (ordinal - 1) % 7 in weekdays]
+        return tuple(date.fromordinal(ordinal) for ordinal in ordinals)
+
+    # Weekly: intervals count whole weeks from the Monday of dtstart's week
+    week_anchor = anchor - dtstart_date.weekday()
+    if weekdays is None:
+        weekdays = (dtstart_date.weekday(),)
+    ordinals = []
+    for weekday in weekdays:
+        ordinal = first + (weekday - (first - 1) % 7) % 7
+        while ordinal <= last and (ordinal - week_anchor) // 7 % interval:
+            ordinal += 7
+        ordinals.extend(range(ordinal, last + 1, 7 * interval))
+    return tuple(date.fromordinal(ordinal) for ordinal in sorted(ordinals))
+
+@lru_cache(maxsize=OCCURRENCE_CACHE_SIZE)
+def _occurrence_dates(rule, dtstart_utc, tz_name, start_date, end_date):
+    user_tz = get_zone(tz_name)
+    simple = _simple_rule(rule)
+    if simple is not None:
+        return _expand_simple(*simple, dtstart_utc.astimezone(user_tz).date(), start_date, end_date)
+
+    rrule = _compile_rule(rule, dtstart_utc, tz_name)
+    return tuple(
+        occurrence.date()
+        for occurrence in rrule.between(
+            datetime.combine(start_date, time.min, tzinfo=user_tz),
+            datetime.combine(end_date, time.max, tzinfo=user_tz),
+            inc=True
+        )
+    )
+
+def local_dates_to_utc(dates, start_time, user_tz):
+    """Return the UTC datetimes of ``start_time`` on each of the sorted local ``dates``.
+
+    The zone offset is looked up at both ends of each 7-day run of dates and
+    applied to the whole run when they agree; only runs that straddle a DST
+    transition fall back to converting date by date.
+    """
+    result = []
+    index, count = 0, len(dates)
+    while index < count:
+        run_end = index
+        while run_end < count and (dates[run_end] - dates[index]).days < 7:
+            run_end += 1
+
+        offset = datetime.combine(dates[index], start_time, tzinfo=user_tz).utcoffset()
+        if datetime.combine(dates[run_end - 1], start_time, tzinfo=user_tz).utcoffset() == offset:
+            result.extend(
+                (datetime.combine(local_date, start_time) - offset).replace(tzinfo=timezone.utc)
+                for local_date in dates[index:run_end]
+            )
+        else:
+            result.extend(
+                datetime.combine(local_date, start_time, tzinfo=user_tz).astimezone(timezone.utc)
+                for local_date in dates[index:run_end]
+            )
+        index = run_end
+    return result
+
+def compile_rule(rule_text, dtstart_utc, user_tz):
+    """Return the parsed rrule for a rule, anchored at ``dtstart_utc`` in ``user_tz``."""
+    return _compile_rule(normalize_rule(rule_text), dtstart_utc, user_tz.key)
+
+def occurrence_dates(rule_text, dtstart_utc, user_tz, start_date, end_date):
+    """Return the local dates between ``start_date`` and ``end_date`` (inclusive) on which a rule occurs.
+
+    Both the parsed rule and the expanded window are cached, keyed by the
+    normalized rule text, the UTC dtstart and the timezone name.
+    """
+    return _occurrence_dates(normalize_rule(rule_text), dtstart_utc, user_tz.key, start_date, end_date)
+
+def cache_stats():
+    """Return hit/miss counters for the rule and occurrence caches."""
+    return {
+        'rules': _compile_rule.cache_info()._asdict(),
+        'occurrences': _occurrence_dates.cache_info()._asdict(),
+    }
+
+def clear_caches():
+    _compile_rule.cache_clear()
+    _occurrence_dates.cache_clear()
@@ -0,0 +1,89 @@
+# app/regeneration.py
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from app.extensions import db
+from app.models import Schedule, ScheduleActivity
+from app.utils import schedule_zone, reconcile_activity_instances, extend_activity_instances
+
+# Config keys a worker process needs to mirror the parent app
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'INSTANCE_HORIZON_DAYS', 'INSTANCE_CHUNK_DAYS', 'SCHEDULE_CACHE_URL')
+
+_worker_app = None
+
+def shard_user_ids(user_ids, shard_count):
+    """Split user ids into at most ``shard_count`` shards; a user's activities never span shards."""
+    shards = [[] for _ in range(max(shard_count, 1))]
+    for user_id in user_ids:
+        shards[user_id % len(shards)].append(user_id)
+    return [shard for shard in shards if shard]
+
+def regenerate_users(user_ids):
+    """Reconcile and extend the instances of every ScheduleActivity on the users' schedules.
+
+    Each ScheduleActivity is expanded in its schedule owner's timezone. Returns a
+    summary dict of users, schedule activities and rows inserted/updated/deleted.
+    """
+    config = current_app.config
+    horizon_end = datetime.now(timezone.utc) + timedelta(days=config['INSTANCE_HORIZON_DAYS'])
+    summary = {'users': len(user_ids), 'schedule_activities': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+
+    schedule_activities = ScheduleActivity.query.join(
+        Schedule, ScheduleActivity.schedule_id == Schedule.id
+    ).filter(
+        Schedule.user_id.in_(user_ids)
+    ).options(
+        joinedload(ScheduleActivity.schedule).joinedload(Schedule.user)
+    ).order_by(ScheduleActivity.id).all()
+
+    for schedule_activity in schedule_activities:
+        user_tz = schedule_zone(schedule_activity)
+        counts = reconcile_activity_instances(schedule_activity, user_tz=user_tz)
+        counts['inserted'] += extend_activity_instances(
+            schedule_activity, user_tz, horizon_end, config['INSTANCE_CHUNK_DAYS']
+        )
+        summary['schedule_activities'] += 1
+        for key in ('inserted', 'updated', 'deleted'):
+            summary[key] += counts[key]
+
+    return summary
+
+def _init_worker(config_overrides):
+    # Each worker builds its own app, and with it its own engine and connection pool
+    global _worker_app
+    from app import create_app
+    from config import Config
+    _worker_app = create_app(type('WorkerConfig', (Config,), config_overrides))
+
+def _run_shard(user_ids):
+    with _worker_app.app_context():
+        return regenerate_users(user_ids)
+
+def regenerate_all(workers=1):
+    """Regenerate instances for every user with scheduled activities, sharded by user.
+
+    With more than one worker the shards run in a process pool. Returns one
+    summary dict per shard.
+    """
+    user_ids = db.session.execute(
+        select(Schedule.user_id).join(ScheduleActivity, ScheduleActivity.schedule_id == Schedule.id)
+        .where(Schedule.user_id.is_not(None))
+        .distinct()
+    ).scalars().all()
+    shards = shard_user_ids(sorted(user_ids), workers)
+
+    if workers <= 1:
+        return [regenerate_users(shard) for shard in shards]
+
+    config_overrides = {key: current_app.config[key] for key in WORKER_CONFIG_KEYS}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(config_overrides,)
+    ) as executor:
+        return list(executor.map(_run_shard, shards))
@@ -5,10 +5,17 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from flask_login import login_user, login_required, logout_user, current_user
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
-from app.models import User, Schedule, Activity, ScheduleActivity, ActivityInstance
+from app.models import User, Schedule, Activity, ScheduleActivity, ActivityInstance, Job
 from app.forms import RegistrationForm, LoginForm, ScheduleActivityForm
-from app.extensions import db
-from app.utils import get_user_schedule, convert_to_local_time, convert_to_utc, create_activity_instances, update_future_instances, delete_future_instances, check_db_content
+from app.jobs import enqueue
+from app.extensions import db, schedule_cache
+from app.etags import conditional
+from app.catalog import MAX_PAGE_SIZE, list_activities, invalidate_catalog
+from app.access import accessible_activity_ids
+from app.identity import invalidate_identity
+from app.read_models import get_day_view
+from app import adherence
+from app.utils import convert_to_local_time, convert_to_utc, find_occurrence, materialize_instance, update_future_instances, delete_future_instances, check_db_content
 from datetime import datetime, timedelta, date
 from zoneinfo import ZoneInfo
 from datetime import timezone, time
@@ -29,6 +36,8 @@ def login():
     if form.validate_on_submit():
         user = db.session.execute(select(User).where(User.email == form.email.data)).scalar_one_or_none()
         if user and user.check_password(form.password.data):
+            # Persists a rehashed password, if check_password upgraded it
+            db.session.commit()
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             if not next_page or not next_page.startswith('/'):
@@ -40,8 +49,8 @@ def login():
 @main_bp.route('/profile')
 @login_required
 def user_profile():
-    db.session.refresh(current_user)
-    return render_template('profile.html', user=current_user)
+    user = db.session.get(User, current_user.id)
+    return render_template('profile.html', user=user)
 
 @main_bp.route('/logout', methods=['POST'])
 @login_required
@@ -57,7 +66,7 @@ def logout_get():
 @login_required
 def home():
     date_str = request.args.get('date')
-    user_tz = ZoneInfo(current_user.timezone)
+    user_tz = current_user.zone
     today = datetime.now(user_tz).date()
 
     try:
@@ -73,23 +82,9 @@ def home():
     else:
         schedule_heading = f"{current_date.strftime('%A, %b %d')} Schedule"
 
-    # Fetch schedule for the current user and date
-    schedule = get_user_schedule(current_user.id, current_date, current_date, user_tz)
-
-    # Sort activities by start time for each date
-    for date, instances in schedule.items():
-        schedule[date] = sorted(instances, key=lambda x: x.schedule_activity.start_time)
-
-    # Correctly interpret `start_time` as a local time
-    for date, instances in schedule.items():
-        for instance in instances:
-            # Interpret the `start_time` as a local time in the user's timezone
-            local_time = instance.schedule_activity.start_time  # Naive `time` object representing local time
-            # Combine date with local `start_time` and set to user's timezone
-            instance_date_local = datetime.combine(instance.instance_date.date(), local_time).replace(tzinfo=user_tz)
-            # Convert local time to UTC for display or further processing
-            instance.instance_date_utc = instance_date_local.astimezone(timezone.utc)
-            instance.instance_date_local = instance_date_local
+    # Cached rows for the current user and date, already sorted by start time
+    instances = get_day_view(current_user.id, current_date, user_tz)
+    schedule = {current_date: instances} if instances else {}
 
     return render_template('home.html', user=current_user, schedule=schedule, current_date=current_date, schedule_heading=schedule_heading)
 
@@ -119,19 +114,29 @@ def register():
 def update_default_notifications():
     data = request.get_json()  # Retrieve JSON data from the request
     default_notifications = data.get('default_notifications', False)
-    current_user.default_notifications = default_notifications
+    user = db.session.get(User, current_user.id)
+    user.default_notifications = default_notifications
+    invalidate_identity(user.id)
     db.session.commit()
 
     return jsonify({"success": True})
 
-@main_bp.route('/doactivity/<int:instance_id>')
-@login_required
-def doactivity(instance_id):
-    instance = ActivityInstance.query.get_or_404(instance_id)
+def _get_occurrence(schedule_activity_id, occurrence_date):
+    """Resolve an occurrence URL to the user's ScheduleActivity and a local date."""
+    schedule_activity = ScheduleActivity.query.get_or_404(schedule_activity_id)
+    if schedule_activity.schedule.user_id != current_user.id:
+        abort(403)
+    try:
+        local_date = datetime.strptime(occurrence_date, '%Y-%m-%d').date()
+    except ValueError:
+        abort(404)
+    return schedule_activity, local_date
+
+def _render_doactivity(instance, complete_url, toggle_url):
     schedule_activity = instance.schedule_activity
 
     # Get user's timezone
-    user_tz = ZoneInfo(current_user.timezone)
+    user_tz = current_user.zone
 
     # Calculate `instance_date_local` for display
     local_time = instance.instance_date.astimezone(user_tz)
@@ -143,19 +148,63 @@ def doactivity(instance_id):
         instance=instance,
         schedule_activity=schedule_activity,
         instance_date_local=instance_date_local,
+        complete_url=complete_url,
+        toggle_url=toggle_url,
         user=current_user  # Pass the current user
     )
 
-@main_bp.route('/complete_activity/<int:instance_id>', methods=['POST'])
+@main_bp.route('/doactivity/<int:instance_id>')
 @login_required
-def complete_activity(instance_id):
+def doactivity(instance_id):
     instance = ActivityInstance.query.get_or_404(instance_id)
+    return _render_doactivity(
+        instance,
+        url_for('main.complete_activity', instance_id=instance.id),
+        url_for('main.toggle_instance_notifications', instance_id=instance.id)
+    )
+
+@main_bp.route('/doactivity/<int:schedule_activity_id>/<occurrence_date>')
+@login_required
+def doactivity_occurrence(schedule_activity_id, occurrence_date):
+    schedule_activity, local_date = _get_occurrence(schedule_activity_id, occurrence_date)
+    instance = find_occurrence(schedule_activity, local_date, current_user.zone)
+    if instance is None:
+        abort(404)
+    if instance.id is not None:
+        return redirect(url_for('main.doactivity', instance_id=instance.id))
+
+    # Nothing is written until the occurrence is completed or toggled
+    return _render_doactivity(
+        instance,
+        url_for('main.complete_occurrence', schedule_activity_id=schedule_activity_id, occurrence_date=occurrence_date),
+        url_for('main.toggle_occurrence_notifications', schedule_activity_id=schedule_activity_id, occurrence_date=occurrence_date)
+    )
+
+def _complete_instance(instance):
+    if not instance.completed:
+        adherence.record_change(instance, current_user.zone, completed=1)
     instance.completed = True
     instance.completion_date = datetime.now(timezone.utc)
+    schedule_cache.invalidate_user(instance.schedule_activity.schedule.user_id)
     db.session.commit()
     flash('Activity marked as completed!')
     return redirect(url_for('main.home'))
 
+@main_bp.route('/complete_activity/<int:instance_id>', methods=['POST'])
+@login_required
+def complete_activity(instance_id):
+    instance = ActivityInstance.query.get_or_404(instance_id)
+    return _complete_instance(instance)
+
+@main_bp.route('/complete_activity/<int:schedule_activity_id>/<occurrence_date>', methods=['POST'])
+@login_required
+def complete_occurrence(schedule_activity_id, occurrence_date):
+    schedule_activity, local_date = _get_occurrence(schedule_activity_id, occurrence_date)
+    instance = materialize_instance(schedule_activity, local_date, current_user.zone)
+    if instance is None:
+        abort(404)
+    return _complete_instance(instance)
+
 @main_bp.route('/schedules')
 @login_required
 def user_schedules():
@@ -167,7 +216,7 @@ def user_schedules():
 @main_bp.route('/add_activity', methods=['POST'])
 @login_required
 def add_activity():
-    user_tz = ZoneInfo(current_user.timezone)
+    user_tz = current_user.zone
     
     # Get date and time from the form
     activity_date_str = request.form['date']  # Expecting 'YYYY-MM-DD'
@@ -192,9 +241,9 @@ def add_activity():
         recurrence=recurrence_rule  # Store the RRULE string in the recurrence field
     )
     db.session.add(new_activity)
+    schedule_cache.invalidate_user(current_user.id)
     db.session.commit()
-    
-    create_activity_instances(new_activity)
+    enqueue('extend_activity', {'schedule_activity_id': new_activity.id}, user_id=current_user.id)
     
     flash('Activity added successfully!')
     return redirect(url_for('main.home'))
@@ -213,6 +262,7 @@ def create_activity():
         recurrence=request.form['recurrence']
     )
     db.session.add(new_activity)
+    invalidate_catalog()
     db.session.commit()
     
     flash('Activity successfully created!')
@@ -220,17 +270,23 @@ def create_activity():
 
 @main_bp.route('/api/activities', methods=['GET'])
 @login_required
+@conditional('activities', 'access:{user_id}')
 def get_all_activities():
-    activities = Activity.query.all()
-    activities_data = [{
-        "id": activity.id,
-        "title": activity.title,
-        "duration": activity.duration,
-        "difficulty": activity.difficulty,
-        "exertion": activity.exertion
-    } for activity in activities]
-    
-    return jsonify(activities_data)
+    # Keyset pagination is opt-in through `limit`; the schedule form fetches the whole catalog
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    category_id = request.args.get('category_id', type=int)
+    activities, next_after_id = list_activities(
+        category_id=category_id, after_id=request.args.get('after', type=int), limit=limit,
+        allowed_ids=accessible_activity_ids(current_user.id)
+    )
+
+    response = jsonify(list(activities))
+    if next_after_id is not None:
+        next_url = url_for('main.get_all_activities', category_id=category_id, after=next_after_id, limit=limit)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
 
 @main_bp.route('/add_activity_to_schedule', methods=['POST'])
 @login_required
@@ -256,8 +312,9 @@ def add_activity_to_schedule():
         dtstart=datetime.now(timezone.utc)
     )
     db.session.add(new_activity)
+    schedule_cache.invalidate_user(current_user.id)
     db.session.commit()
-    create_activity_instances(new_activity)
+    enqueue('extend_activity', {'schedule_activity_id': new_activity.id}, user_id=current_user.id)
     flash('Activity added successfully!', 'success')
     return redirect(url_for('main.user_schedules'))
 
@@ -271,6 +328,7 @@ def update_activity_notifications(activity_id):
         return jsonify({"success": False, "error": "Unauthorized"}), 403
     
     schedule_activity.generate_notifications = data.get('generate_notifications', False)
+    schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
     db.session.commit()
     
     return jsonify({"success": True, "new_state": schedule_activity.generate_notifications})
@@ -296,22 +354,29 @@ def update_activity(activity_id):
     activity_date_str = request.form.get('date')
     if activity_date_str:
         activity_date = datetime.strptime(activity_date_str, '%Y-%m-%d').date()
-        user_tz = ZoneInfo(current_user.timezone)
+        user_tz = current_user.zone
         local_dt = datetime.combine(activity_date, new_start_time, tzinfo=user_tz)
         new_dtstart = local_dt.astimezone(timezone.utc)
         if activity.dtstart != new_dtstart:
             activity.dtstart = new_dtstart
             changed_fields.append('dtstart')
     
+    schedule_cache.invalidate_user(activity.schedule.user_id)
     db.session.commit()
     
     if 'start_time' in changed_fields or 'recurrence' in changed_fields or 'dtstart' in changed_fields:
-        # Delete and regenerate future instances
-        create_activity_instances(activity)
+        # Only write the instances that actually changed
+        enqueue('reconcile_activity', {'schedule_activity_id': activity.id}, user_id=current_user.id)
     
     flash('Activity updated successfully!')
     return redirect(url_for('main.home'))
 
+def _set_instance_notifications(activity_instance, enabled):
+    enabled = bool(enabled)
+    if enabled != activity_instance.generate_notifications:
+        adherence.record_change(activity_instance, current_user.zone, notifications=1 if enabled else -1)
+    activity_instance.generate_notifications = enabled
+
 @main_bp.route('/toggle_instance_notifications/<int:instance_id>', methods=['POST'])
 @login_required
 def toggle_instance_notifications(instance_id):
@@ -321,11 +386,27 @@ def toggle_instance_notifications(instance_id):
     if activity_instance.schedule_activity.schedule.user_id != current_user.id:
         return jsonify({"success": False, "error": "Unauthorized"}), 403
     
-    activity_instance.generate_notifications = data.get('generate_notifications', False)
+    _set_instance_notifications(activity_instance, data.get('generate_notifications', False))
+    schedule_cache.invalidate_user(current_user.id)
     db.session.commit()
     
     return jsonify({"success": True})
 
+@main_bp.route('/toggle_instance_notifications/<int:schedule_activity_id>/<occurrence_date>', methods=['POST'])
+@login_required
+def toggle_occurrence_notifications(schedule_activity_id, occurrence_date):
+    data = request.json
+    schedule_activity, local_date = _get_occurrence(schedule_activity_id, occurrence_date)
+    activity_instance = materialize_instance(schedule_activity, local_date, current_user.zone)
+    if activity_instance is None:
+        return jsonify({"success": False, "error": "Not found"}), 404
+
+    _set_instance_notifications(activity_instance, data.get('generate_notifications', False))
+    schedule_cache.invalidate_user(current_user.id)
+    db.session.commit()
+
+    return jsonify({"success": True, "instance_id": activity_instance.id})
+
 @main_bp.route('/delete_activity/<int:schedule_id>/<int:activity_id>', methods=['POST'])
 @login_required
 def delete_activity(schedule_id, activity_id):
@@ -338,6 +419,7 @@ def delete_activity(schedule_id, activity_id):
 
         delete_future_instances(activity)
         db.session.delete(activity)
+        schedule_cache.invalidate_user(current_user.id)
         db.session.commit()
         
         return jsonify({"message": "Activity deleted successfully"}), 200
@@ -349,13 +431,10 @@ def delete_activity(schedule_id, activity_id):
 @main_bp.route('/generate_instances', methods=['GET', 'POST'])
 @login_required
 def generate_instances():
-    activities = ScheduleActivity.query.all()
-    print(f"Total ScheduleActivities found: {len(activities)}")
-    for activity in activities:
-        print(f"Processing ScheduleActivity ID: {activity.id}")
-        create_activity_instances(activity)
-    
-    flash('Activity instances generated for all scheduled activities!', 'success')
+    # Only the current user's schedules; all tenants go through `flask regenerate-instances`
+    enqueue('regenerate_user', {'user_id': current_user.id}, user_id=current_user.id)
+
+    flash('Your schedules are being refreshed.', 'success')
     return redirect(url_for('main.user_schedules'))
 
 @main_bp.route('/edit_activity/<int:schedule_id>/<int:activity_id>', methods=['POST'])
@@ -376,19 +455,26 @@ def edit_activity(schedule_id, activity_id):
 
     # Parse start_time
     start_time = datetime.strptime(start_time_str, '%H:%M').time()
+    notifications_changed = activity.generate_notifications != generate_notifications
 
     activity.start_time = start_time
     activity.duration = int(duration)
     activity.recurrence = recurrence
     activity.generate_notifications = generate_notifications
 
+    schedule_cache.invalidate_user(current_user.id)
     db.session.commit()
-    create_activity_instances(activity)  # Regenerate instances
+    enqueue(
+        'reconcile_activity',
+        {'schedule_activity_id': activity.id, 'sync_notifications': notifications_changed},
+        user_id=current_user.id
+    )
     flash('Activity updated successfully!', 'success')
     return redirect(url_for('main.user_schedules'))
 
 @main_bp.route('/edit_activity/<int:schedule_id>/<int:activity_id>', methods=['GET'])
 @login_required
+@conditional('user:{user_id}', 'activities')
 def get_activity_details(schedule_id, activity_id):
     activity = ScheduleActivity.query.filter_by(id=activity_id, schedule_id=schedule_id).first_or_404()
 
@@ -405,4 +491,21 @@ def get_activity_details(schedule_id, activity_id):
         "generate_notifications": activity.generate_notifications
     })
 
+@main_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.user_id != current_user.id:
+        return jsonify({"error": "Unauthorized access."}), 403
+
+    return jsonify({
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error if job.status == 'failed' else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    })
+
 # app/routes.py end
\ No newline at end of file
@@ -1,15 +1,24 @@
 # app/routes.py
 
-from flask import request, jsonify, render_template, flash, redirect, url_for, Blueprint
+import json
+from flask import request, jsonify, render_template, flash, redirect, url_for, Blueprint, Response, current_app, stream_with_context
 from flask_restful import Resource
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from flask_login import login_user, login_required, logout_user, current_user
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 from app.models import User, Schedule, Activity, ScheduleActivity, ActivityInstance
 from app.forms import RegistrationForm, LoginForm
-from app.extensions import db
-from app.utils import get_user_schedule, convert_to_local_time, convert_to_utc, create_activity_instances, update_future_instances, delete_future_instances, check_db_content
+from app.extensions import db, schedule_cache
+from app.etags import conditional
+from app.access import invalidate_access
+from app.adherence import completion_rate, daily_stats
+from app.coaching import coach_dashboard
+from app.claims import api_identity, issue_token
+from app.identity import invalidate_identity
+from app.jobs import enqueue
+from app.recurrence import get_zone
+from app.utils import _as_utc, iter_user_schedule, convert_to_local_time, convert_to_utc, create_activity_instances, update_future_instances, delete_future_instances, check_db_content
 from datetime import datetime, timedelta, date
 from zoneinfo import ZoneInfo
 from datetime import timezone, time
@@ -18,8 +27,17 @@ main_bp = Blueprint('main', __name__)
 
 # API Routes
 
+def _schedule_activity_owner(user_id, activity_id):
+    owner_id = db.session.execute(
+        select(Schedule.user_id)
+        .join(ScheduleActivity, ScheduleActivity.schedule_id == Schedule.id)
+        .where(ScheduleActivity.id == activity_id)
+    ).scalar()
+    return f'user:{owner_id}'
+
 class ActivityDetail(Resource):
     @jwt_required()
+    @conditional(_schedule_activity_owner, 'activities')
     def get(self, activity_id):
         activity = ScheduleActivity.query.get_or_404(activity_id)
         return {
@@ -33,16 +51,16 @@ class ActivityDetail(Resource):
 class ScheduleActivityList(Resource):
     @jwt_required()
     def post(self, schedule_id):
-        user_id = get_jwt_identity()
-        schedule = Schedule.query.filter_by(id=schedule_id, user_id=user_id).first_or_404()
+        identity = api_identity()
+        schedule = Schedule.query.filter_by(id=schedule_id, user_id=identity.id).first_or_404()
 
         data = request.form
         activity = Activity.query.get_or_404(data['activity_id'])
 
-        user_tz = ZoneInfo(current_user.timezone)
+        user_tz = identity.zone
         start_time = datetime.strptime(data['start_time'], '%H:%M').time()
         local_dt = datetime.combine(schedule.start_date, start_time, tzinfo=user_tz)
-        utc_dtstart = local_dt.astimezone(datetime.timezone.utc)
+        utc_dtstart = local_dt.astimezone(timezone.utc)
 
         new_activity = ScheduleActivity(
             schedule_id=schedule_id,
@@ -53,16 +71,16 @@ class ScheduleActivityList(Resource):
             recurrence=data['recurrence']
         )
         db.session.add(new_activity)
+        schedule_cache.invalidate_user(schedule.user_id)
         db.session.commit()
-
-        create_activity_instances(new_activity)
+        enqueue('extend_activity', {'schedule_activity_id': new_activity.id}, user_id=identity.id)
 
         return {"message": "Activity added successfully", "id": new_activity.id}, 201
 
 class ScheduleActivityDetail(Resource):
     @jwt_required()
     def put(self, schedule_id, activity_id):
-        user_id = get_jwt_identity()
+        user_id = api_identity().id
         schedule = Schedule.query.filter_by(id=schedule_id, user_id=user_id).first_or_404()
         activity = ScheduleActivity.query.get_or_404(activity_id)
 
@@ -102,12 +120,13 @@ class ScheduleActivityDetail(Resource):
 
     @jwt_required()
     def delete(self, schedule_id, activity_id):
-        user_id = get_jwt_identity()
+        user_id = api_identity().id
         schedule = Schedule.query.filter_by(id=schedule_id, user_id=user_id).first_or_404()
         activity = ScheduleActivity.query.get_or_404(activity_id)
 
         delete_future_instances(activity)
         db.session.delete(activity)
+        schedule_cache.invalidate_user(schedule.user_id)
         db.session.commit()
 
         return {"message": "Activity deleted successfully"}
@@ -166,15 +185,25 @@ class UserLogin(Resource):
         data = request.get_json()
         user = User.query.filter_by(email=data['email']).first()
         if user and user.check_password(data['password']):
-            access_token = create_access_token(identity=user.id)
-            return {"access_token": access_token}, 200
+            # Persists a rehashed password, if check_password upgraded it
+            db.session.commit()
+            access_token = issue_token(user.id)
+            refresh_token = create_refresh_token(identity=str(user.id))
+            return {"access_token": access_token, "refresh_token": refresh_token}, 200
         return {"message": "Invalid credentials"}, 401
 
+class TokenRefresh(Resource):
+    @jwt_required(refresh=True)
+    def post(self):
+        user_id = int(get_jwt_identity())
+        if db.session.get(User, user_id) is None:
+            return {"message": "Invalid credentials"}, 401
+        return {"access_token": issue_token(user_id)}, 200
+
 class UserProfile(Resource):
     @jwt_required()
     def get(self):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = db.session.get(User, api_identity().id)
         return {
             "id": user.id,
             "first_name": user.first_name,
@@ -183,10 +212,30 @@ class UserProfile(Resource):
             "mobile": user.mobile
         }
 
+    @jwt_required()
+    def put(self):
+        user = db.session.get(User, api_identity().id)
+        data = request.get_json()
+        if 'timezone' in data:
+            try:
+                get_zone(data['timezone'])
+            except (KeyError, ValueError):
+                return {"message": "Unknown timezone"}, 400
+        for field in ('first_name', 'last_name', 'mobile', 'timezone'):
+            if field in data:
+                setattr(user, field, data[field])
+        if 'timezone' in data:
+            schedule_cache.invalidate_user(user.id)
+        invalidate_identity(user.id)
+        db.session.commit()
+        # The old token's claims are out of date, so hand back one built from the new row
+        return {"message": "Profile updated successfully", "access_token": issue_token(user.id)}, 200
+
 class ScheduleList(Resource):
     @jwt_required()
+    @conditional('user:{user_id}')
     def get(self):
-        user_id = get_jwt_identity()
+        user_id = api_identity().id
         schedules = Schedule.query.filter_by(user_id=user_id).all()
         return jsonify([{
             "id": s.id,
@@ -197,7 +246,7 @@ class ScheduleList(Resource):
     
     @jwt_required()
     def post(self):
-        user_id = get_jwt_identity()
+        user_id = api_identity().id
         data = request.get_json()
         new_schedule = Schedule(
             user_id=user_id,
@@ -206,13 +255,16 @@ class ScheduleList(Resource):
             end_date=data.get('end_date')
         )
         db.session.add(new_schedule)
+        schedule_cache.invalidate_user(user_id)
+        invalidate_access(user_id)
         db.session.commit()
         return {"message": "Schedule created successfully", "id": new_schedule.id}, 201
 
 class ScheduleDetail(Resource):
     @jwt_required()
+    @conditional('user:{user_id}')
     def get(self, schedule_id):
-        user_id = get_jwt_identity()
+        user_id = api_identity().id
         schedule = Schedule.query.filter_by(id=schedule_id, user_id=user_id).first()
         if not schedule:
             return {"message": "Schedule not found"}, 404
@@ -232,12 +284,105 @@ class ScheduleDetail(Resource):
             } for sa in activities]
         }
 
+def _stream_schedule(days, start_date, end_date, user_tz):
+    # Emit the document one day at a time as ``days`` produces them
+    yield json.dumps({
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "timezone": user_tz.key
+    })[:-1] + ', "days": ['
+    for index, (local_date, instances) in enumerate(days):
+        day = json.dumps({
+            "date": local_date.isoformat(),
+            "instances": [{
+                "id": instance.id,
+                "schedule_activity_id": instance.schedule_activity_id,
+                "title": instance.schedule_activity.activity.title,
+                "start": _as_utc(instance.instance_date).astimezone(user_tz).isoformat(),
+                "duration": instance.schedule_activity.duration,
+                "completed": bool(instance.completed),
+                "generate_notifications": instance.generate_notifications
+            } for instance in instances]
+        })
+        yield day if index == 0 else ',' + day
+    yield ']}'
+
+class ScheduleRange(Resource):
+    @jwt_required()
+    def get(self):
+        identity = api_identity()
+
+        try:
+            start_date = date.fromisoformat(request.args['start'])
+            end_date = date.fromisoformat(request.args.get('end', request.args['start']))
+        except (KeyError, ValueError):
+            return {"message": "start and end must be dates in YYYY-MM-DD format"}, 400
+
+        max_days = current_app.config['SCHEDULE_RANGE_MAX_DAYS']
+        if end_date < start_date or (end_date - start_date).days >= max_days:
+            return {"message": f"Range must run forward and span at most {max_days} days"}, 400
+
+        user_tz = identity.zone
+        days = iter_user_schedule(identity.id, start_date, end_date, user_tz)
+        return Response(
+            stream_with_context(_stream_schedule(days, start_date, end_date, user_tz)),
+            mimetype='application/json'
+        )
+
+class AdherenceStats(Resource):
+    """Daily scheduled/completed/notification counts, read from the daily_adherence rollup only."""
+
+    @jwt_required()
+    @conditional('user:{user_id}')
+    def get(self):
+        identity = api_identity()
+        today = datetime.now(identity.zone).date()
+
+        try:
+            end_date = date.fromisoformat(request.args['end']) if 'end' in request.args else today
+            start_date = date.fromisoformat(request.args['start']) if 'start' in request.args else end_date - timedelta(days=29)
+            category_id = request.args.get('category_id', type=int)
+        except ValueError:
+            return {"message": "start and end must be dates in YYYY-MM-DD format"}, 400
+
+        max_days = current_app.config['ADHERENCE_RANGE_MAX_DAYS']
+        if end_date < start_date or (end_date - start_date).days >= max_days:
+            return {"message": f"Range must run forward and span at most {max_days} days"}, 400
+
+        days = daily_stats([identity.id], start_date, end_date, category_id)[identity.id]
+        scheduled = sum(day[1] for day in days)
+        completed = sum(day[2] for day in days)
+        return {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "category_id": category_id,
+            "scheduled": scheduled,
+            "completed": completed,
+            "completion_rate": completion_rate(completed, scheduled),
+            "days": [{
+                "date": local_date.isoformat(),
+                "scheduled": day_scheduled,
+                "completed": day_completed,
+                "notifications": notifications,
+                "completion_rate": completion_rate(day_completed, day_scheduled)
+            } for local_date, day_scheduled, day_completed, notifications in days]
+        }
+
+class CoachDashboard(Resource):
+    @jwt_required()
+    def get(self):
+        return {"clients": coach_dashboard(api_identity().id)}
+
 def init_api(api):
     api.add_resource(UserRegistration, '/api/register')
     api.add_resource(UserLogin, '/api/login')
+    api.add_resource(TokenRefresh, '/api/token/refresh')
     api.add_resource(UserProfile, '/api/profile')
     api.add_resource(ScheduleList, '/api/schedules')
     api.add_resource(ScheduleDetail, '/api/schedules/<int:schedule_id>')
+    api.add_resource(ScheduleRange, '/api/schedule/range')
+    api.add_resource(AdherenceStats, '/api/stats/adherence')
+    api.add_resource(CoachDashboard, '/api/coach/dashboard')
     api.add_resource(ActivityDetail, '/api/activity/<int:activity_id>')
     api.add_resource(ScheduleActivityList, '/api/schedule/<int:schedule_id>/activity')
     api.add_resource(ScheduleActivityDetail, '/api/schedule/<int:schedule_id>/activity/<int:activity_id>')
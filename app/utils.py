@@ -1,43 +1,256 @@
+import csv
+import heapq
+import io
 from datetime import datetime, timezone, timedelta, time, date
+from itertools import groupby
+from operator import itemgetter
 from zoneinfo import ZoneInfo
-from app.models import Schedule, ScheduleActivity, ActivityInstance, Activity, User, ActivityShare, ScheduleShare
-from app.extensions import db
-from dateutil.rrule import rrulestr
+from app.models import Schedule, ScheduleActivity, ActivityInstance, Activity
+from app.extensions import db, schedule_cache
+from app.recurrence import get_zone, occurrence_dates, local_dates_to_utc
+from app.catalog import invalidate_catalog
+from app import adherence
 from dateutil.parser import parse
-from flask_login import current_user
+from sqlalchemy import insert, select, update, delete, bindparam, and_, cast, func, literal, Date, Time
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
 
-def create_activity_instances(schedule_activity, end_date=None):
-    user_tz = ZoneInfo(current_user.timezone)
+def _as_utc(value):
+    # SQLite hands back naive datetimes for timezone-aware columns
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
 
+def expand_instance_rows(schedule_activity, user_tz, start_local, end_local):
+    """Expand a ScheduleActivity's recurrence into plain insert tuples.
+
+    Returns a list of ``(schedule_activity_id, instance_date_utc, generate_notifications)``
+    tuples for every occurrence on the local dates from ``start_local`` to ``end_local``.
+    """
+    dates = occurrence_dates(
+        schedule_activity.recurrence, _as_utc(schedule_activity.dtstart), user_tz,
+        start_local.astimezone(user_tz).date(), end_local.astimezone(user_tz).date()
+    )
+
+    return [
+        (schedule_activity.id, instance_date, schedule_activity.generate_notifications)
+        for instance_date in local_dates_to_utc(dates, schedule_activity.start_time, user_tz)
+    ]
+
+def bulk_insert_instances(rows, user_id):
+    """Write instance tuples in one round trip and return the number of rows written.
+
+    ``user_id`` is the owner of the rows' schedule, denormalized onto each row.
+    PostgreSQL gets a COPY; every other backend gets a single executemany that
+    SQLAlchemy renders as multi-row INSERT batches.
+    """
+    if not rows:
+        return 0
+
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for schedule_activity_id, instance_date, generate_notifications in rows:
+            writer.writerow([
+                schedule_activity_id, user_id, instance_date.isoformat(), 'f', 't' if generate_notifications else 'f'
+            ])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                "COPY activity_instances (schedule_activity_id, user_id, instance_date, completed, generate_notifications) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+    else:
+        db.session.execute(
+            insert(ActivityInstance.__table__),
+            [
+                {
+                    'schedule_activity_id': schedule_activity_id,
+                    'user_id': user_id,
+                    'instance_date': instance_date,
+                    'completed': False,
+                    'generate_notifications': generate_notifications,
+                }
+                for schedule_activity_id, instance_date, generate_notifications in rows
+            ]
+        )
+    return len(rows)
+
+def _instance_window(user_tz, end_date=None):
     if end_date is None:
-        end_date = datetime.now(user_tz) + timedelta(days=365)
+        end_date = datetime.now(user_tz) + timedelta(days=current_app.config['INSTANCE_HORIZON_DAYS'])
 
     today_local = datetime.now(user_tz).date()
     start_of_today_local = datetime.combine(today_local, time.min, tzinfo=user_tz)
+    return start_of_today_local, end_date
+
+def _stored_local_dates(schedule_activity, user_tz, start_utc, end_utc):
+    table = ActivityInstance.__table__
+    return {
+        _as_utc(instance_date).astimezone(user_tz).date()
+        for instance_date in db.session.execute(
+            select(table.c.instance_date).where(
+                table.c.schedule_activity_id == schedule_activity.id,
+                table.c.instance_date >= start_utc,
+                table.c.instance_date <= end_utc
+            )
+        ).scalars()
+    }
+
+def schedule_zone(schedule_activity):
+    """Return the timezone of the user a ScheduleActivity's schedule belongs to."""
+    return get_zone(schedule_activity.schedule.user.timezone)
+
+def create_activity_instances(schedule_activity, end_date=None, user_tz=None):
+    """Replace the future instances of a ScheduleActivity up to the rolling horizon.
+
+    Occurrences are placed in ``user_tz``, defaulting to the schedule owner's
+    timezone. Advances ``materialized_until`` to ``end_date`` and returns a dict
+    with the ``deleted`` and ``inserted`` row counts.
+    """
+    user_tz = user_tz or schedule_zone(schedule_activity)
+    start_of_today_local, end_date = _instance_window(user_tz, end_date)
 
     start_of_today_utc = start_of_today_local.astimezone(timezone.utc)
     deleted_rows = ActivityInstance.query.filter(
         ActivityInstance.schedule_activity_id == schedule_activity.id,
         ActivityInstance.instance_date >= start_of_today_utc
     ).delete(synchronize_session=False)
+
+    rows = expand_instance_rows(schedule_activity, user_tz, start_of_today_local, end_date)
+    inserted_rows = bulk_insert_instances(rows, schedule_activity.schedule.user_id)
+    adherence.refresh(schedule_activity.schedule.user_id, user_tz, start_of_today_local.date())
+    schedule_activity.materialized_until = end_date.astimezone(timezone.utc)
+    schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
     db.session.commit()
 
-    dtstart_local = schedule_activity.dtstart.astimezone(user_tz)
-    rrule = rrulestr(schedule_activity.recurrence, dtstart=dtstart_local)
-    dates = rrule.between(start_of_today_local, end_date, inc=True)
+    return {'deleted': deleted_rows, 'inserted': inserted_rows}
 
-    for date in dates:
-        instance_datetime_local = datetime.combine(date.date(), schedule_activity.start_time, tzinfo=user_tz)
-        instance_datetime_utc = instance_datetime_local.astimezone(timezone.utc)
+def extend_activity_instances(schedule_activity, user_tz, horizon_end, chunk_days):
+    """Materialize a ScheduleActivity's instances from its watermark up to ``horizon_end``.
 
-        activity_instance = ActivityInstance(
-            schedule_activity_id=schedule_activity.id,
-            instance_date=instance_datetime_utc,
-            generate_notifications=schedule_activity.generate_notifications
+    Works in ``chunk_days`` chunks, skipping dates that already have a row. Each
+    chunk advances ``materialized_until`` and commits, so an interrupted run
+    resumes from the last checkpoint. Returns the number of rows inserted.
+    """
+    start_of_today_utc = _instance_window(user_tz)[0].astimezone(timezone.utc)
+    chunk_start = start_of_today_utc
+    if schedule_activity.materialized_until is not None:
+        chunk_start = max(chunk_start, _as_utc(schedule_activity.materialized_until))
+
+    inserted_rows = 0
+    while chunk_start < horizon_end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), horizon_end)
+
+        stored = _stored_local_dates(
+            schedule_activity, user_tz, chunk_start - timedelta(days=1), chunk_end + timedelta(days=1)
         )
-        db.session.add(activity_instance)
+        rows = [
+            row for row in expand_instance_rows(
+                schedule_activity, user_tz, chunk_start.astimezone(user_tz), chunk_end.astimezone(user_tz)
+            )
+            if row[1].astimezone(user_tz).date() not in stored
+        ]
+        inserted_rows += bulk_insert_instances(rows, schedule_activity.schedule.user_id)
+        adherence.record_instances(schedule_activity.schedule.user_id, rows, user_tz)
+        schedule_activity.materialized_until = chunk_end
+        if rows:
+            schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
+        db.session.commit()
+        chunk_start = chunk_end
+
+    return inserted_rows
+
+def reconcile_activity_instances(schedule_activity, sync_notifications=False, user_tz=None):
+    """Bring the future instances of a ScheduleActivity in line with its current rule.
+
+    Stored rows are matched to the new occurrences by local date. Rows that moved
+    get their ``instance_date`` updated, occurrences without a row are inserted up
+    to the ``materialized_until`` watermark (later ones stay virtual) and rows for
+    dates that no longer occur are deleted. Completed rows and rows with a mood or
+    notes are never touched. With ``sync_notifications`` the instance
+    ``generate_notifications`` flag is reset to the ScheduleActivity's value.
+
+    Returns a dict with ``inserted``, ``updated``, ``deleted`` and ``unchanged`` counts.
+    """
+    user_tz = user_tz or schedule_zone(schedule_activity)
+    start_of_today_local, _ = _instance_window(user_tz)
+    start_of_today_utc = start_of_today_local.astimezone(timezone.utc)
+    table = ActivityInstance.__table__
+
+    existing = db.session.execute(
+        select(table.c.id, table.c.instance_date, table.c.completed, table.c.mood,
+               table.c.notes, table.c.generate_notifications)
+        .where(
+            table.c.schedule_activity_id == schedule_activity.id,
+            table.c.instance_date >= start_of_today_utc
+        )
+        .order_by(table.c.instance_date)
+    ).all()
+
+    materialized_until = start_of_today_utc
+    if schedule_activity.materialized_until is not None:
+        materialized_until = max(materialized_until, _as_utc(schedule_activity.materialized_until))
+
+    # Expand far enough to cover the watermark and every stored row
+    last_local_date = max(
+        [materialized_until] + [_as_utc(row.instance_date) for row in existing]
+    ).astimezone(user_tz).date()
+    wanted = {
+        instance_date.astimezone(user_tz).date(): (instance_date, generate_notifications)
+        for _, instance_date, generate_notifications in expand_instance_rows(
+            schedule_activity, user_tz, start_of_today_local,
+            datetime.combine(last_local_date, time.max, tzinfo=user_tz)
+        )
+    }
+
+    updates, delete_ids, unchanged = [], [], 0
+    for row in existing:
+        instance_date = _as_utc(row.instance_date)
+        local_date = instance_date.astimezone(user_tz).date()
+        target = wanted.pop(local_date, None)
+
+        if row.completed or row.mood or row.notes:
+            unchanged += 1
+        elif target is None:
+            delete_ids.append(row.id)
+        else:
+            new_date, new_notifications = target
+            if not sync_notifications:
+                new_notifications = row.generate_notifications
+            if new_date != instance_date or new_notifications != row.generate_notifications:
+                updates.append({'b_id': row.id, 'b_date': new_date, 'b_notifications': new_notifications})
+            else:
+                unchanged += 1
+
+    if delete_ids:
+        db.session.execute(delete(table).where(table.c.id.in_(delete_ids)))
+    if updates:
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam('b_id'))
+            .values(instance_date=bindparam('b_date'), generate_notifications=bindparam('b_notifications')),
+            updates
+        )
+    new_rows = [
+        (schedule_activity.id, instance_date, generate_notifications)
+        for instance_date, generate_notifications in wanted.values()
+        if instance_date <= materialized_until
+    ]
+    inserted_rows = bulk_insert_instances(new_rows, schedule_activity.schedule.user_id)
+    if updates or delete_ids:
+        adherence.refresh(schedule_activity.schedule.user_id, user_tz, start_of_today_local.date())
+    else:
+        adherence.record_instances(schedule_activity.schedule.user_id, new_rows, user_tz)
+    if inserted_rows or updates or delete_ids:
+        schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
     db.session.commit()
 
+    return {'inserted': inserted_rows, 'updated': len(updates), 'deleted': len(delete_ids), 'unchanged': unchanged}
+
 def clone_activity(activity_id, new_owner_id):
     original = Activity.query.get(activity_id)
     cloned = Activity(
@@ -46,40 +259,71 @@ def clone_activity(activity_id, new_owner_id):
         # Copy other fields from the original
     )
     db.session.add(cloned)
+    invalidate_catalog()
     db.session.commit()
     return cloned
 
-def get_accessible_activities(user_id):
-    user = User.query.get(user_id)
-    public_activities = Activity.query.filter_by(access_level='public')
-    own_activities = Activity.query.filter_by(owner_id=user_id)
-    shared_activities = Activity.query.join(ActivityShare).filter(ActivityShare.user_id == user_id)
-    system_activities = Activity.query.filter_by(is_system=True)
-    return public_activities.union(own_activities, shared_activities, system_activities)
-
-def get_accessible_schedules(user_id):
-    user = User.query.get(user_id)
-    public_schedules = Schedule.query.filter_by(access_level='public')
-    own_schedules = Schedule.query.filter_by(owner_id=user_id)
-    shared_schedules = Schedule.query.join(ScheduleShare).filter(ScheduleShare.user_id == user_id)
-    system_schedules = Schedule.query.filter_by(is_system=True)
-    return public_schedules.union(own_schedules, shared_schedules, system_schedules)
-
-def update_future_instances(schedule_activity, changed_fields):
-    current_time = datetime.now(timezone.utc)
-    future_instances = ActivityInstance.query.filter(
-        ActivityInstance.schedule_activity_id == schedule_activity.id,
-        ActivityInstance.instance_date > current_time
-    ).all()
+def update_future_instances(schedule_activity, changed_fields, user_tz=None):
+    """Apply ScheduleActivity edits to its pending future instances without loading them.
+
+    Issues one set-based UPDATE per changed field family and returns the number
+    of rows affected. On PostgreSQL the new ``start_time`` is applied in SQL in
+    the owner's timezone; other backends read ``(id, instance_date)`` tuples
+    and write the new timestamps back in a single executemany. A recurrence
+    change alters which dates occur, so it goes through
+    ``reconcile_activity_instances`` instead.
+    """
+    user_tz = user_tz or schedule_zone(schedule_activity)
+    table = ActivityInstance.__table__
+
+    if 'recurrence' in changed_fields:
+        counts = reconcile_activity_instances(schedule_activity, user_tz=user_tz)
+        return counts['inserted'] + counts['updated'] + counts['deleted']
 
-    for instance in future_instances:
-        if 'start_time' in changed_fields:
-            new_time = datetime.combine(instance.instance_date.date(), schedule_activity.start_time)
-            instance.instance_date = new_time.replace(tzinfo=timezone.utc)
-        
-        # Add other field updates as necessary
+    pending = and_(
+        table.c.schedule_activity_id == schedule_activity.id,
+        table.c.instance_date > datetime.now(timezone.utc),
+        table.c.completed.is_(False)
+    )
+    affected_rows = 0
+
+    if 'start_time' in changed_fields:
+        start_time = schedule_activity.start_time
+        if db.session.get_bind().dialect.name == 'postgresql':
+            local_date = cast(func.timezone(user_tz.key, table.c.instance_date), Date)
+            new_date = func.timezone(user_tz.key, local_date + literal(start_time, Time))
+            affected_rows += db.session.execute(
+                update(table).where(pending).values(instance_date=new_date)
+            ).rowcount
+        else:
+            updates = [
+                {
+                    'b_id': row_id,
+                    'b_date': datetime.combine(
+                        _as_utc(instance_date).astimezone(user_tz).date(), start_time, tzinfo=user_tz
+                    ).astimezone(timezone.utc),
+                }
+                for row_id, instance_date in db.session.execute(
+                    select(table.c.id, table.c.instance_date).where(pending)
+                )
+            ]
+            if updates:
+                db.session.execute(
+                    update(table).where(table.c.id == bindparam('b_id')).values(instance_date=bindparam('b_date')),
+                    updates
+                )
+            affected_rows += len(updates)
 
+    if 'generate_notifications' in changed_fields:
+        affected_rows += db.session.execute(
+            update(table).where(pending).values(generate_notifications=schedule_activity.generate_notifications)
+        ).rowcount
+
+    if affected_rows:
+        adherence.refresh(schedule_activity.schedule.user_id, user_tz, datetime.now(user_tz).date())
+    schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
     db.session.commit()
+    return affected_rows
 
 def delete_future_instances(schedule_activity):
     current_time = datetime.now(timezone.utc)
@@ -87,43 +331,135 @@ def delete_future_instances(schedule_activity):
         ActivityInstance.schedule_activity_id == schedule_activity.id,
         ActivityInstance.instance_date > current_time
     ).delete()
+    user_tz = schedule_zone(schedule_activity)
+    adherence.refresh(schedule_activity.schedule.user_id, user_tz, current_time.astimezone(user_tz).date())
+    schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
     db.session.commit()
 
 from datetime import datetime, time
 from zoneinfo import ZoneInfo
 
-def get_user_schedule(user_id, start_date, end_date, user_tz):
-    # Start and end of the day in user's local time
-    start_datetime_local = datetime.combine(start_date, time.min, tzinfo=user_tz)
-    end_datetime_local = datetime.combine(end_date, time.max, tzinfo=user_tz)
-
-    # Convert to UTC for querying
-    start_datetime_utc = start_datetime_local.astimezone(timezone.utc)
-    end_datetime_utc = end_datetime_local.astimezone(timezone.utc)
-
-    # Fetch instances within the UTC time range
-    instances = db.session.query(ActivityInstance).join(
-        ScheduleActivity, ActivityInstance.schedule_activity_id == ScheduleActivity.id
-    ).join(
+class VirtualInstance:
+    """An occurrence of a ScheduleActivity that has no activity_instances row yet.
+
+    Exposes the same attributes templates read from ActivityInstance; ``id`` is
+    ``None`` until the occurrence is materialized with ``materialize_instance``.
+    """
+    id = None
+    completed = False
+    completion_date = None
+    mood = None
+    notes = None
+
+    def __init__(self, schedule_activity, instance_date):
+        self.schedule_activity = schedule_activity
+        self.schedule_activity_id = schedule_activity.id
+        self.instance_date = instance_date
+        self.generate_notifications = schedule_activity.generate_notifications
+
+STREAM_CHUNK_SIZE = 500
+
+def _virtual_days(schedule_activity, user_tz, start_local, end_local):
+    for _, instance_date, _ in expand_instance_rows(schedule_activity, user_tz, start_local, end_local):
+        yield instance_date.astimezone(user_tz).date(), 0, VirtualInstance(schedule_activity, instance_date)
+
+def iter_user_schedule(user_id, start_date, end_date, user_tz):
+    """Yield ``(local_date, instances)`` in date order for each day between two local dates that has any.
+
+    Occurrences are expanded from each ScheduleActivity's recurrence; stored
+    ActivityInstance rows (completions, notes, notification overrides)
+    replace the matching virtual occurrence. Stored rows come from a single
+    range query on (user_id, instance_date), read STREAM_CHUNK_SIZE at a
+    time, and merged in day by day, so only one day's instances are held at
+    once. Each day's instances are ordered by start time.
+    """
+    start_local = datetime.combine(start_date, time.min, tzinfo=user_tz)
+    end_local = datetime.combine(end_date, time.max, tzinfo=user_tz)
+
+    schedule_activities = ScheduleActivity.query.join(
         Schedule, ScheduleActivity.schedule_id == Schedule.id
     ).filter(
-        Schedule.user_id == user_id,
-        ActivityInstance.instance_date >= start_datetime_utc,
-        ActivityInstance.instance_date <= end_datetime_utc
+        Schedule.user_id == user_id
     ).options(
-        db.joinedload(ActivityInstance.schedule_activity).joinedload(ScheduleActivity.activity)
+        db.joinedload(ScheduleActivity.activity)
     ).all()
 
-    # Group instances by date in user's local time
-    schedule = {}
-    for instance in instances:
-        # Convert instance_date to user's local time zone
-        instance_date_local = instance.instance_date.astimezone(user_tz).date()
-        if instance_date_local not in schedule:
-            schedule[instance_date_local] = []
-        schedule[instance_date_local].append(instance)
+    # Each instance's schedule_activity resolves from the identity map populated above
+    stored = db.session.execute(
+        select(ActivityInstance).where(
+            ActivityInstance.user_id == user_id,
+            ActivityInstance.instance_date >= start_local.astimezone(timezone.utc),
+            ActivityInstance.instance_date <= end_local.astimezone(timezone.utc)
+        ).order_by(ActivityInstance.user_id, ActivityInstance.instance_date)
+        .execution_options(yield_per=STREAM_CHUNK_SIZE)
+    ).scalars()
 
-    return schedule
+    # Stored rows sort after the virtual occurrences of their day, so they win
+    entries = heapq.merge(
+        *(_virtual_days(schedule_activity, user_tz, start_local, end_local) for schedule_activity in schedule_activities),
+        ((_as_utc(instance.instance_date).astimezone(user_tz).date(), 1, instance) for instance in stored),
+        key=lambda entry: entry[:2]
+    )
+    for local_date, day_entries in groupby(entries, key=itemgetter(0)):
+        by_activity = {instance.schedule_activity_id: instance for _, _, instance in day_entries}
+        yield local_date, sorted(by_activity.values(), key=lambda instance: _as_utc(instance.instance_date))
+
+def get_user_schedule(user_id, start_date, end_date, user_tz):
+    """Return the user's instances between two local dates, grouped by local date.
+
+    See ``iter_user_schedule``; use that to stream long windows.
+    """
+    return dict(iter_user_schedule(user_id, start_date, end_date, user_tz))
+
+def find_occurrence(schedule_activity, local_date, user_tz):
+    """Return the stored ActivityInstance or a VirtualInstance for one local date.
+
+    Returns ``None`` if ``local_date`` is not an occurrence of the ScheduleActivity.
+    """
+    start_of_day_local = datetime.combine(local_date, time.min, tzinfo=user_tz)
+    end_of_day_local = datetime.combine(local_date, time.max, tzinfo=user_tz)
+
+    instance = ActivityInstance.query.filter(
+        ActivityInstance.schedule_activity_id == schedule_activity.id,
+        ActivityInstance.instance_date >= start_of_day_local.astimezone(timezone.utc),
+        ActivityInstance.instance_date <= end_of_day_local.astimezone(timezone.utc)
+    ).first()
+    if instance is not None:
+        return instance
+
+    rows = expand_instance_rows(schedule_activity, user_tz, start_of_day_local, end_of_day_local)
+    if not rows:
+        return None
+    return VirtualInstance(schedule_activity, rows[0][1])
+
+def materialize_instance(schedule_activity, local_date, user_tz):
+    """Return the ActivityInstance for an occurrence, creating its row on first touch.
+
+    Returns ``None`` if ``local_date`` is not an occurrence of the ScheduleActivity.
+    """
+    instance = find_occurrence(schedule_activity, local_date, user_tz)
+    if instance is None or instance.id is not None:
+        return instance
+
+    instance = ActivityInstance(
+        schedule_activity_id=schedule_activity.id,
+        user_id=schedule_activity.schedule.user_id,
+        instance_date=instance.instance_date,
+        generate_notifications=instance.generate_notifications
+    )
+    db.session.add(instance)
+    adherence.record_instances(
+        schedule_activity.schedule.user_id,
+        [(schedule_activity.id, instance.instance_date, instance.generate_notifications)], user_tz
+    )
+    schedule_cache.invalidate_user(schedule_activity.schedule.user_id)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request materialized the same occurrence first, and bumped the version
+        db.session.rollback()
+        instance = find_occurrence(schedule_activity, local_date, user_tz)
+    return instance
 
 def convert_to_local_time(utc_time, local_tz):
     return utc_time.astimezone(local_tz)
@@ -146,10 +482,8 @@ def check_db_content(user_id, start_date, end_date):
         end_date = end_date.replace(tzinfo=timezone.utc)
     
     
-    instances = db.session.query(ActivityInstance).join(ScheduleActivity, ActivityInstance.schedule_activity_id == ScheduleActivity.id).join(
-        Schedule, ScheduleActivity.schedule_id == Schedule.id
-    ).filter(
-        Schedule.user_id == user_id,
+    instances = db.session.query(ActivityInstance).filter(
+        ActivityInstance.user_id == user_id,
         ActivityInstance.instance_date >= start_date,
         ActivityInstance.instance_date <= end_date
     ).all()
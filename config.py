@@ -12,9 +12,49 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
     CSRF_ENABLED = True
+    INSTANCE_HORIZON_DAYS = int(os.environ.get('INSTANCE_HORIZON_DAYS', 28))
+    INSTANCE_CHUNK_DAYS = int(os.environ.get('INSTANCE_CHUNK_DAYS', 7))
+    JOBS_RUN_INLINE = os.environ.get('JOBS_RUN_INLINE', '').lower() in ('1', 'true')
+    # A running job whose worker has been silent this long is claimed again
+    JOBS_LEASE_SECONDS = int(os.environ.get('JOBS_LEASE_SECONDS', 900))
+    JOBS_RETRY_SECONDS = int(os.environ.get('JOBS_RETRY_SECONDS', 30))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
+    # Day-view cache; Redis when a URL is set, otherwise in-process per worker with the version
+    # counters in the database, so per-worker caches never serve invalidated entries
+    SCHEDULE_CACHE_URL = os.environ.get('SCHEDULE_CACHE_URL')
+    SCHEDULE_CACHE_SIZE = int(os.environ.get('SCHEDULE_CACHE_SIZE', 4096))
+    SCHEDULE_CACHE_TTL = int(os.environ.get('SCHEDULE_CACHE_TTL', 300))
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 16))
+    # Channels every reminder goes out on, for users with the channel's contact details
+    NOTIFICATION_CHANNELS = os.environ.get('NOTIFICATION_CHANNELS', 'email').split(',')
+    NOTIFICATION_SMS_TRANSPORT = os.environ.get('NOTIFICATION_SMS_TRANSPORT', 'log')
+    NOTIFICATION_PUSH_TRANSPORT = os.environ.get('NOTIFICATION_PUSH_TRANSPORT', 'log')
+    NOTIFICATION_BREAKER_THRESHOLD = int(os.environ.get('NOTIFICATION_BREAKER_THRESHOLD', 5))
+    NOTIFICATION_BREAKER_RESET_SECONDS = int(os.environ.get('NOTIFICATION_BREAKER_RESET_SECONDS', 30))
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 60))
+    OUTBOX_RETRY_SECONDS = int(os.environ.get('OUTBOX_RETRY_SECONDS', 30))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+    CATALOG_TTL = int(os.environ.get('CATALOG_TTL', 300))
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    SCHEDULE_RANGE_MAX_DAYS = int(os.environ.get('SCHEDULE_RANGE_MAX_DAYS', 92))
+    ADHERENCE_RANGE_MAX_DAYS = int(os.environ.get('ADHERENCE_RANGE_MAX_DAYS', 366))
+    COACH_DASHBOARD_TTL = int(os.environ.get('COACH_DASHBOARD_TTL', 60))
+    EMAIL_TRANSPORT = os.environ.get('EMAIL_TRANSPORT', 'postmark')
+    POSTMARK_API_KEY = os.environ.get('POSTMARK_API_KEY')
+    POSTMARK_SENDER_EMAIL = os.environ.get('POSTMARK_SENDER_EMAIL')
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 500))
+    EMAIL_MAX_CONCURRENCY = int(os.environ.get('EMAIL_MAX_CONCURRENCY', 4))
+    EMAIL_MAX_RETRIES = int(os.environ.get('EMAIL_MAX_RETRIES', 3))
+    EMAIL_RETRY_BACKOFF = float(os.environ.get('EMAIL_RETRY_BACKOFF', 0.5))
 
 class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory database for testing
     WTF_CSRF_ENABLED = False  # Disable CSRF for testing purposes
+    EMAIL_TRANSPORT = 'fake'
+    NOTIFICATION_SMS_TRANSPORT = 'fake'
+    NOTIFICATION_PUSH_TRANSPORT = 'fake'
+    EMAIL_RETRY_BACKOFF = 0
     DEBUG = False
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""Add denormalized user_id to activity_instances
+
+Revision ID: 1a1dd456013e
+Revises: b89b79af6e79
+Create Date: 2026-10-18 13:05:22.671954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a1dd456013e'
+down_revision = 'b89b79af6e79'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity_instances', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('activity_instances_user_id_fkey', 'users', ['user_id'], ['id'])
+
+    # Backfill from the owning schedule before building the index
+    op.execute(
+        """
+        UPDATE activity_instances
+        SET user_id = (
+            SELECT schedules.user_id
+            FROM schedule_activities
+            JOIN schedules ON schedules.id = schedule_activities.schedule_id
+            WHERE schedule_activities.id = activity_instances.schedule_activity_id
+        )
+        """
+    )
+
+    with op.batch_alter_table('activity_instances', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_instances_user_id_instance_date', ['user_id', 'instance_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_instances', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_instances_user_id_instance_date')
+        batch_op.drop_constraint('activity_instances_user_id_fkey', type_='foreignkey')
+        batch_op.drop_column('user_id')
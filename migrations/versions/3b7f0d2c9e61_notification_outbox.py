@@ -0,0 +1,66 @@
+"""Turn notifications into an outbox
+
+Revision ID: 3b7f0d2c9e61
+Revises: e5a8c3f17d24
+Create Date: 2026-10-18 16:20:44.118302
+
+The old table (a time of day and a ``sent`` flag) was never written by the
+app and its rows cannot be keyed to an instance time, so it is recreated.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f0d2c9e61'
+down_revision = 'e5a8c3f17d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Base tables predate these migrations, so the old table may not exist
+    if sa.inspect(op.get_bind()).has_table('notifications'):
+        op.drop_table('notifications')
+    op.create_table('notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('schedule_activity_id', sa.Integer(), nullable=False),
+    sa.Column('activity_instance_id', sa.Integer(), nullable=True),
+    sa.Column('due_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('notification_type', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['schedule_activity_id'], ['schedule_activities.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('schedule_activity_id', 'due_at', 'notification_type', name='unique_notification')
+    )
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_notifications_pending', ['next_attempt_at'], unique=False,
+            postgresql_where=sa.text("status = 'pending'"),
+            sqlite_where=sa.text("status = 'pending'")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_pending')
+
+    op.drop_table('notifications')
+    op.create_table('notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('schedule_activity_id', sa.Integer(), nullable=False),
+    sa.Column('notification_time', sa.Time(), nullable=False),
+    sa.Column('notification_type', sa.String(length=20), nullable=False),
+    sa.Column('sent', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['schedule_activity_id'], ['schedule_activities.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
@@ -0,0 +1,26 @@
+"""Drop identity_version from users
+
+Revision ID: 3f9c1d7e2b68
+Revises: e7b3c5a9d120
+Create Date: 2026-10-18 22:04:16.318402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d7e2b68'
+down_revision = 'e7b3c5a9d120'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('identity_version')
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('identity_version', sa.Integer(), server_default=sa.text('0'), nullable=False))
@@ -0,0 +1,28 @@
+"""Add cache_versions
+
+Revision ID: 5c81f0e3a2d4
+Revises: 9d4e6a1b7c05
+Create Date: 2026-10-18 19:12:08.417203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c81f0e3a2d4'
+down_revision = '9d4e6a1b7c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_versions')
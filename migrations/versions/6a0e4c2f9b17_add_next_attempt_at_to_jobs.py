@@ -0,0 +1,26 @@
+"""Add next_attempt_at to jobs
+
+Revision ID: 6a0e4c2f9b17
+Revises: 3f9c1d7e2b68
+Create Date: 2026-10-18 22:41:09.772135
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0e4c2f9b17'
+down_revision = '3f9c1d7e2b68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_column('next_attempt_at')
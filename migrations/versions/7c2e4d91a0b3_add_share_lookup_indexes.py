@@ -0,0 +1,32 @@
+"""Add (user_id, object id) indexes to the share tables
+
+Revision ID: 7c2e4d91a0b3
+Revises: 1a1dd456013e
+Create Date: 2026-10-18 14:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4d91a0b3'
+down_revision = '1a1dd456013e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity_shares', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_shares_user_id_activity_id', ['user_id', 'activity_id'], unique=False)
+
+    with op.batch_alter_table('schedule_shares', schema=None) as batch_op:
+        batch_op.create_index('ix_schedule_shares_user_id_schedule_id', ['user_id', 'schedule_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('schedule_shares', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedule_shares_user_id_schedule_id')
+
+    with op.batch_alter_table('activity_shares', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_shares_user_id_activity_id')
@@ -0,0 +1,36 @@
+"""Add daily_adherence rollup
+
+Revision ID: 9d4e6a1b7c05
+Revises: 3b7f0d2c9e61
+Create Date: 2026-10-18 17:05:32.640917
+
+Run ``flask backfill-adherence`` after upgrading to fill it from existing instances.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4e6a1b7c05'
+down_revision = '3b7f0d2c9e61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_adherence',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('local_date', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('scheduled', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('notifications', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'local_date', 'category_id')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_adherence')
@@ -0,0 +1,26 @@
+"""Add identity_version to users
+
+Revision ID: a2f6d8c14e97
+Revises: 5c81f0e3a2d4
+Create Date: 2026-10-18 19:48:51.203716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2f6d8c14e97'
+down_revision = '5c81f0e3a2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('identity_version', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('identity_version')
@@ -0,0 +1,30 @@
+"""Add partial index on pending notification instances
+
+Revision ID: e5a8c3f17d24
+Revises: 7c2e4d91a0b3
+Create Date: 2026-10-18 15:02:11.504873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c3f17d24'
+down_revision = '7c2e4d91a0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('activity_instances', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_activity_instances_due', ['instance_date'], unique=False,
+            postgresql_where=sa.text('generate_notifications AND NOT completed'),
+            sqlite_where=sa.text('generate_notifications AND NOT completed')
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('activity_instances', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_instances_due')
@@ -0,0 +1,36 @@
+"""Index pending notifications by channel
+
+Revision ID: e7b3c5a9d120
+Revises: a2f6d8c14e97
+Create Date: 2026-10-18 20:21:37.552480
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3c5a9d120'
+down_revision = 'a2f6d8c14e97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_pending')
+        batch_op.create_index(
+            'ix_notifications_pending_channel', ['notification_type', 'next_attempt_at'], unique=False,
+            postgresql_where=sa.text("status = 'pending'"),
+            sqlite_where=sa.text("status = 'pending'")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_pending_channel')
+        batch_op.create_index(
+            'ix_notifications_pending', ['next_attempt_at'], unique=False,
+            postgresql_where=sa.text("status = 'pending'"),
+            sqlite_where=sa.text("status = 'pending'")
+        )
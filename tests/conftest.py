@@ -1,12 +1,40 @@
 # tests/conftest.py
 
 import pytest
+from datetime import datetime, date, time, timezone
+from flask_login import login_user
 from app import create_app
-from app.extensions import db as _db
+from app.cache import RedisBackend
+from app.extensions import db as _db, schedule_cache
+from app.identity import invalidate_identity
+from app.access import invalidate_access
+from app.models import User, Category, Activity, Schedule, ScheduleActivity, ActivityInstance, DailyAdherence
 from config import TestConfig
 from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+        self.expiry[key] = ex
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1).encode()
+        return int(self.data[key])
+
 @pytest.fixture(scope='session')
 def app():
     app = create_app(config_class=TestConfig)
@@ -38,3 +66,57 @@ def session(db):
     session.remove()
     transaction.rollback()
     connection.close()
+
+@pytest.fixture
+def schedule_activity(app, db):
+    db.session.rollback()
+    user = User(
+        first_name='Util',
+        last_name='User',
+        email='util@example.com',
+        mobile='5550001111',
+        timezone='America/New_York',
+        password_hash='x'
+    )
+    category = Category(code='util', name='Util')
+    db.session.add_all([user, category])
+    db.session.commit()
+    # Ids are reused across tests; drop anything cached for a previous user with this id
+    schedule_cache.invalidate_user(user.id)
+    invalidate_identity(user.id)
+    invalidate_access(user.id)
+    db.session.commit()
+
+    schedule = Schedule(owner_id=user.id, user_id=user.id, name='Util Schedule', start_date=date(2024, 1, 1))
+    activity = Activity(owner_id=user.id, category_id=category.id, title='Stretch', step=1,
+                        duration=10, difficulty='Easy', exertion='Low')
+    db.session.add_all([schedule, activity])
+    db.session.commit()
+
+    schedule_activity = ScheduleActivity(
+        schedule_id=schedule.id,
+        activity_id=activity.id,
+        start_time=time(7, 0),
+        dtstart=datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc),
+        duration=10,
+        recurrence='RRULE:FREQ=DAILY'
+    )
+    db.session.add(schedule_activity)
+    db.session.commit()
+
+    with app.test_request_context():
+        login_user(user)
+        yield schedule_activity
+
+    ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).delete()
+    DailyAdherence.query.filter_by(user_id=user.id).delete()
+    for obj in (schedule_activity, activity, schedule, category, user):
+        db.session.delete(obj)
+    db.session.commit()
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point the schedule cache at an in-memory stand-in for Redis and return the client."""
+    client = FakeRedis()
+    monkeypatch.setattr(schedule_cache, 'backend', RedisBackend(client))
+    return client
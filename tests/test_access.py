@@ -0,0 +1,39 @@
+# tests/test_access.py
+
+from app.access import accessible_activity_ids, get_accessible_activities
+from app.models import User, Activity, ActivityShare
+
+def test_access_resolution_matches_own_shared_and_public(schedule_activity, db):
+    owner = schedule_activity.schedule.user
+    other = User(first_name='Other', last_name='User', email='other@example.com',
+                 mobile='5550002222', timezone='UTC', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+
+    def activity(title, **kwargs):
+        return Activity(owner_id=owner.id, category_id=schedule_activity.activity.category_id, title=title,
+                        step=1, duration=5, difficulty='Easy', exertion='Low', **kwargs)
+    private, public, shared = activity('Private'), activity('Public', access_level='public'), activity('Shared')
+    db.session.add_all([private, public, shared])
+    db.session.commit()
+
+    visible = accessible_activity_ids(other.id)
+    assert public.id in visible and private.id not in visible and shared.id not in visible
+
+    # Share writes retire the cached set themselves
+    share = ActivityShare(activity_id=shared.id, user_id=other.id)
+    db.session.add(share)
+    db.session.commit()
+    assert shared.id in accessible_activity_ids(other.id)
+
+    query_ids = {a.id for a in get_accessible_activities(other.id)}
+    assert query_ids == set(accessible_activity_ids(other.id))
+    assert {private.id, public.id, shared.id} <= accessible_activity_ids(owner.id)
+
+    db.session.delete(share)
+    db.session.commit()
+    assert shared.id not in accessible_activity_ids(other.id)
+
+    for obj in (private, public, shared, other):
+        db.session.delete(obj)
+    db.session.commit()
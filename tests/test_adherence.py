@@ -0,0 +1,55 @@
+# tests/test_adherence.py
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from app import adherence
+from app.claims import issue_token
+from app.models import DailyAdherence
+from app.utils import create_activity_instances, materialize_instance
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+def _rollup(user_id):
+    return {
+        row.local_date: (row.scheduled, row.completed, row.notifications)
+        for row in DailyAdherence.query.filter_by(user_id=user_id)
+    }
+
+def test_rollup_tracks_generators_and_completion(schedule_activity, db):
+    user_id = schedule_activity.schedule.user_id
+    counts = create_activity_instances(schedule_activity)
+    rollup = _rollup(user_id)
+    assert sum(scheduled for scheduled, _, _ in rollup.values()) == counts['inserted']
+
+    # An occurrence in the past is counted when it is materialized and completed
+    past = datetime.now(NEW_YORK).date() - timedelta(days=3)
+    instance = materialize_instance(schedule_activity, past, NEW_YORK)
+    adherence.record_change(instance, NEW_YORK, completed=1)
+    instance.completed = True
+    db.session.commit()
+    assert _rollup(user_id)[past] == (1, 1, 0)
+
+    # Incremental counts match a rebuild from the instances
+    incremental = _rollup(user_id)
+    adherence.refresh(user_id, NEW_YORK)
+    db.session.commit()
+    assert _rollup(user_id) == incremental
+
+def test_adherence_stats_reads_rollup(app, schedule_activity, db):
+    user_id = schedule_activity.schedule.user_id
+    day = datetime.now(NEW_YORK).date() - timedelta(days=1)
+    instance = materialize_instance(schedule_activity, day, NEW_YORK)
+    adherence.record_change(instance, NEW_YORK, completed=1)
+    instance.completed = True
+    db.session.commit()
+
+    response = app.test_client().get(
+        f'/api/stats/adherence?start={day.isoformat()}&end={day.isoformat()}',
+        headers={'Authorization': f'Bearer {issue_token(user_id)}'}
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['scheduled'] == 1 and data['completion_rate'] == 1.0
+    assert data['days'] == [{
+        'date': day.isoformat(), 'scheduled': 1, 'completed': 1, 'notifications': 0, 'completion_rate': 1.0
+    }]
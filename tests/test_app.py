@@ -4,6 +4,9 @@ import pytest
 from app.models import User, Schedule, Activity, ScheduleActivity
 from flask import url_for
 from werkzeug.security import generate_password_hash
+from datetime import date
+from zoneinfo import ZoneInfo
+from app.utils import get_user_schedule
 
 def test_register(client, db):
     response = client.post('/register', data={
@@ -129,10 +132,12 @@ def test_add_activity(client, db, session):
     }, follow_redirects=True)
     assert b'Activity added successfully!' in response.data
 
-    # Verify activity instances are created
+    # Verify activity instances are expanded on read without writing rows
     schedule_activity = ScheduleActivity.query.filter_by(schedule_id=schedule.id).first()
     assert schedule_activity is not None
-    assert len(schedule_activity.instances) == 5
+    assert len(schedule_activity.instances) == 0
+    schedule = get_user_schedule(user.id, date(2023, 1, 2), date(2023, 1, 8), ZoneInfo('UTC'))
+    assert sum(len(instances) for instances in schedule.values()) == 5
 
 def test_api_user_registration(client, db):
     response = client.post('/api/register', json={
@@ -0,0 +1,117 @@
+# tests/test_cache.py
+
+import json
+import pytest
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from app.cache import MemoryBackend, RedisBackend, ScheduleCache
+from app.extensions import schedule_cache
+from app.models import CacheVersion, ScheduleActivity
+from app.read_models import DayRow, get_day_view, load_day_rows
+from app.utils import materialize_instance
+
+@pytest.fixture
+def cache_backend(monkeypatch):
+    backend = MemoryBackend(maxsize=16)
+    monkeypatch.setattr(schedule_cache, 'backend', backend)
+    return backend
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(maxsize=2)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert backend.get('a') == 1
+    assert backend.get('b') is None
+
+def test_redis_backend_stores_json_with_ttl(fake_redis):
+    client = fake_redis
+    backend = RedisBackend(client)
+    backend.set('day', [['a', 1]], ttl=30)
+    assert client.expiry['day'] == 30
+    assert backend.get('day') == [['a', 1]]
+    backend.delete('day')
+    assert backend.get('day') is None
+
+def test_day_cache_is_shared_through_redis_and_retired_by_version(schedule_activity, db, fake_redis):
+    # Two workers: each has its own ScheduleCache over the same Redis
+    client = fake_redis
+    other = ScheduleCache()
+    other.backend, other.ttl = RedisBackend(client), schedule_cache.ttl
+    user_id = schedule_activity.schedule.user_id
+    user_tz = ZoneInfo('America/New_York')
+    day = datetime.now(user_tz).date() + timedelta(days=2)
+
+    get_day_view(user_id, day, user_tz)
+    assert other.get_day(user_id, user_tz.key, day) is not None
+    stored = db.session.get(CacheVersion, f'user:{user_id}')
+    stored_version = stored.version if stored else 0
+
+    schedule_cache.invalidate_user(user_id)
+    db.session.commit()
+    assert client.data[f'version:user:{user_id}'] == b'1'
+    assert other.get_day(user_id, user_tz.key, day) is None
+    # Redis keeps the counter; the database table is left alone
+    db.session.expire_all()
+    stored = db.session.get(CacheVersion, f'user:{user_id}')
+    assert (stored.version if stored else 0) == stored_version
+
+def test_bumps_join_the_callers_transaction(db):
+    db.session.rollback()
+    name = 'test:versions'
+    start = schedule_cache.version(name)
+    schedule_cache.bump(name)
+    assert schedule_cache.version(name) == start
+    db.session.rollback()
+    assert schedule_cache.version(name) == start
+
+    schedule_cache.bump(name)
+    db.session.commit()
+    assert db.session.get(CacheVersion, name).version == start + 1
+    assert schedule_cache.versions([name, 'test:never-bumped']) == [start + 1, 0]
+
+def test_get_day_view_is_cached_until_invalidated(schedule_activity, cache_backend):
+    user_id = schedule_activity.schedule.user_id
+    user_tz = ZoneInfo('America/New_York')
+    day = datetime.now(user_tz).date() + timedelta(days=2)
+
+    rows = get_day_view(user_id, day, user_tz)
+    assert rows == [DayRow(None, schedule_activity.id, day.isoformat(), '07:00', '07:00 AM', 'Stretch', 10, False)]
+    assert get_day_view(user_id, day, user_tz) == rows
+    assert len(cache_backend._entries) == 1
+
+    instance = materialize_instance(schedule_activity, day, user_tz)
+    assert get_day_view(user_id, day, user_tz)[0].id == instance.id
+
+def test_get_day_view_rebuilds_rows_from_json(schedule_activity, cache_backend):
+    user_id = schedule_activity.schedule.user_id
+    user_tz = ZoneInfo('America/New_York')
+    day = datetime.now(user_tz).date() + timedelta(days=2)
+
+    rows = get_day_view(user_id, day, user_tz)
+    key = next(iter(cache_backend._entries))
+    cache_backend.set(key, json.loads(json.dumps(rows)))
+    assert get_day_view(user_id, day, user_tz) == rows
+
+def test_day_rows_are_ordered_by_their_own_time(schedule_activity, db):
+    user_id = schedule_activity.schedule.user_id
+    user_tz = ZoneInfo('America/New_York')
+    day = datetime.now(user_tz).date() + timedelta(days=2)
+    later = ScheduleActivity(
+        schedule_id=schedule_activity.schedule_id, activity_id=schedule_activity.activity_id,
+        start_time=time(8, 0), dtstart=datetime(2024, 1, 1, 13, 0, tzinfo=timezone.utc),
+        duration=10, recurrence='RRULE:FREQ=DAILY'
+    )
+    db.session.add(later)
+    db.session.commit()
+
+    # The 07:00 occurrence is moved to 09:00, past the projected 08:00 one
+    instance = materialize_instance(schedule_activity, day, user_tz)
+    instance.instance_date = datetime.combine(day, time(9, 0), tzinfo=user_tz).astimezone(timezone.utc)
+    db.session.commit()
+    rows = load_day_rows(user_id, day, user_tz)
+    assert [(row.id, row.start_time) for row in rows] == [(None, '08:00'), (instance.id, '09:00')]
+
+    db.session.delete(later)
+    db.session.commit()
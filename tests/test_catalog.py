@@ -0,0 +1,64 @@
+# tests/test_catalog.py
+
+from app import catalog
+from app.catalog import get_catalog, list_activities, invalidate_catalog
+from app.models import Activity, CacheVersion
+
+def test_catalog_pages_by_keyset_within_category(schedule_activity, db):
+    category_id = schedule_activity.activity.category_id
+    owner_id = schedule_activity.schedule.user_id
+    extra = [
+        Activity(owner_id=owner_id, category_id=category_id, title=f'Walk {n}', step=1,
+                 duration=5, difficulty='Easy', exertion='Low')
+        for n in range(3)
+    ]
+    db.session.add_all(extra)
+    db.session.commit()
+    invalidate_catalog()
+    db.session.commit()
+
+    page, next_after_id = list_activities(category_id=category_id, limit=3)
+    assert [entry['title'] for entry in page] == ['Stretch', 'Walk 0', 'Walk 1']
+    rest, last_cursor = list_activities(category_id=category_id, after_id=next_after_id, limit=3)
+    assert [entry['title'] for entry in rest] == ['Walk 2']
+    assert last_cursor is None
+
+    for activity in extra:
+        db.session.delete(activity)
+    db.session.commit()
+    invalidate_catalog()
+    db.session.commit()
+
+def test_catalog_is_reused_until_invalidated(schedule_activity, db):
+    category_id = schedule_activity.activity.category_id
+    invalidate_catalog()
+    db.session.commit()
+    catalog = get_catalog(category_id)
+    assert get_catalog(category_id) is catalog
+
+    schedule_activity.activity.title = 'Deep Stretch'
+    db.session.commit()
+    assert get_catalog(category_id)[0]['title'] == 'Stretch'
+
+    invalidate_catalog()
+    db.session.commit()
+    assert get_catalog(category_id)[0]['title'] == 'Deep Stretch'
+
+def test_catalog_follows_the_database_version_and_expires(schedule_activity, db, app, monkeypatch):
+    category_id = schedule_activity.activity.category_id
+    invalidate_catalog()
+    db.session.commit()
+    assert get_catalog(category_id)[0]['title'] == 'Stretch'
+
+    # Without Redis, another worker's invalidate_catalog reaches this one through the database
+    schedule_activity.activity.title = 'Deep Stretch'
+    db.session.get(CacheVersion, 'activities').version += 1
+    db.session.commit()
+    assert get_catalog(category_id)[0]['title'] == 'Deep Stretch'
+
+    # Writes that never invalidate show up once the TTL runs out
+    schedule_activity.activity.title = 'Long Stretch'
+    db.session.commit()
+    assert get_catalog(category_id)[0]['title'] == 'Deep Stretch'
+    monkeypatch.setattr(catalog.time, 'monotonic', lambda: catalog._catalog[1] + app.config['CATALOG_TTL'])
+    assert get_catalog(category_id)[0]['title'] == 'Long Stretch'
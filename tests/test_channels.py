@@ -0,0 +1,59 @@
+# tests/test_channels.py
+
+from app.channels import Channel, CircuitBreaker, LogTransport, PushMessage, TokenBucket
+from app.email_service import FakeTransport
+
+def test_token_bucket_grants_up_to_burst():
+    bucket = TokenBucket(rate=0.001, burst=3)
+    assert bucket.take(5) == 3
+    assert bucket.take(1) == 0
+    assert bucket.wait_time() > 0
+
+def test_circuit_breaker_opens_and_half_opens(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('app.channels.time.monotonic', lambda: clock[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open' and not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()
+    # Only one trial call while half-open
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed' and breaker.allow()
+
+def test_channel_defers_over_rate_and_while_open():
+    transport = FakeTransport(fail_batches=1)
+    channel = Channel('sms', transport, rate=0.001, burst=3, max_concurrency=1, failure_threshold=1)
+    items = [(index, f'message {index}') for index in range(4)]
+
+    outcome = channel.send(items)
+    assert outcome.failed == (0, 1, 2)
+    assert outcome.deferred == (3,) and outcome.retry_after > 0
+    assert channel.breaker.state == 'open'
+
+    outcome = channel.send(items[3:])
+    assert outcome.deferred == (3,) and transport.batches == 1
+
+def test_channel_reads_delivery_results_from_any_transport():
+    channel = Channel('push', LogTransport('push'), rate=10, burst=10, max_concurrency=1)
+    assert channel.send([(1, PushMessage(7, 'Stretch', 'Reminder'))]) == ((), (), None)
+
+def test_sms_reminders_use_fake_transport(app, schedule_activity, db):
+    from datetime import datetime, timezone
+    from app.extensions import notification_channels
+    from app.notifications import CHANNEL_LOADERS, CHANNEL_SENDERS, Reminder
+
+    transport, notification_channels['sms'].transport = notification_channels['sms'].transport, FakeTransport()
+    try:
+        user = schedule_activity.schedule.user
+        reminder = Reminder(1, user.id, schedule_activity.id, datetime(2024, 1, 2, 12, 0, tzinfo=timezone.utc), 'sms')
+        assert CHANNEL_SENDERS['sms']([reminder], CHANNEL_LOADERS['sms']([reminder])) == ((), (), None)
+        message, = notification_channels['sms'].transport.outbox
+    finally:
+        notification_channels['sms'].transport = transport
+    assert message.to == user.mobile
+    assert message.body == 'Reminder: Stretch at 07:00 AM'
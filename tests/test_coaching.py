@@ -0,0 +1,42 @@
+# tests/test_coaching.py
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from app.claims import issue_token
+from app.extensions import schedule_cache
+from app.models import CoachClient, DailyAdherence, User
+
+def test_coach_dashboard_summarizes_clients_from_rollup(app, schedule_activity, db):
+    client = schedule_activity.schedule.user
+    category_id = schedule_activity.activity.category_id
+    coach = User(first_name='Coach', last_name='Carter', email='coach@example.com', mobile='5550002222',
+                 timezone='UTC', password_hash='x')
+    db.session.add(coach)
+    db.session.commit()
+    link = CoachClient(coach_id=coach.id, client_id=client.id)
+    today = datetime.now(ZoneInfo(client.timezone)).date()
+    db.session.add_all([
+        link,
+        DailyAdherence(user_id=client.id, local_date=today, category_id=category_id, scheduled=2, completed=1, notifications=0),
+        DailyAdherence(user_id=client.id, local_date=today - timedelta(days=10), category_id=category_id,
+                       scheduled=2, completed=2, notifications=0),
+    ])
+    db.session.commit()
+    schedule_cache.backend.delete(f'coach:{coach.id}')
+
+    try:
+        response = app.test_client().get(
+            '/api/coach/dashboard', headers={'Authorization': f'Bearer {issue_token(coach.id)}'}
+        )
+        assert response.status_code == 200
+        summary, = response.get_json()['clients']
+        assert summary['client_id'] == client.id
+        assert summary['today'] == {'scheduled': 2, 'completed': 1}
+        assert summary['completion_rate_7d'] == 0.5
+        assert summary['completion_rate_30d'] == 0.75
+        assert summary['last_active'] == today.isoformat()
+    finally:
+        schedule_cache.backend.delete(f'coach:{coach.id}')
+        db.session.delete(link)
+        db.session.delete(coach)
+        db.session.commit()
@@ -0,0 +1,43 @@
+# tests/test_email_service.py
+
+import pytest
+from app.email_service import EmailMessage, FakeTransport, login_code_message, send_email
+from app.extensions import email_service
+
+@pytest.fixture
+def outbox(app):
+    transport = email_service.transport
+    email_service.transport = FakeTransport()
+    yield email_service.transport
+    email_service.transport = transport
+
+def test_send_email_renders_login_code(app, outbox):
+    with app.app_context():
+        result = send_email('someone@example.com', '123456')
+    assert result.ok
+    message, = outbox.outbox
+    assert message.subject == '123456 is your Sup App login code'
+    assert '<div class="highlight">123456</div>' in message.html_body
+
+def test_templates_escape_context():
+    message = login_code_message('someone@example.com', '<b>')
+    assert '&lt;b&gt;' in message.html_body
+
+def test_send_many_batches_and_retries(app, outbox, monkeypatch):
+    monkeypatch.setattr(email_service, 'batch_size', 2)
+    outbox.fail_batches = 1
+    messages = [EmailMessage(f'user{index}@example.com', 'Hi', '<p>Hi</p>') for index in range(5)]
+
+    results = email_service.send_many(messages)
+    assert [result.to for result in results] == [message.to for message in messages]
+    assert all(result.ok for result in results)
+    # Three batches plus one retried failure
+    assert outbox.batches == 4
+    assert sorted(message.to for message in outbox.outbox) == sorted(message.to for message in messages)
+
+def test_send_many_gives_up_after_max_retries(app, outbox, monkeypatch):
+    monkeypatch.setattr(email_service, 'max_retries', 1)
+    outbox.fail_batches = 2
+    result = email_service.send(EmailMessage('someone@example.com', 'Hi', '<p>Hi</p>'))
+    assert not result.ok and result.retryable
+    assert outbox.outbox == []
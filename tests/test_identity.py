@@ -0,0 +1,39 @@
+# tests/test_identity.py
+
+from zoneinfo import ZoneInfo
+from sqlalchemy import event
+from app.identity import Identity, load_identity, invalidate_identity
+
+def test_load_identity_is_cached_until_invalidated(schedule_activity, db):
+    user = schedule_activity.schedule.user
+    invalidate_identity(user.id)
+    db.session.commit()
+
+    identity = load_identity(user.id)
+    assert isinstance(identity, Identity)
+    assert identity.get_id() == str(user.id)
+    assert identity.zone == ZoneInfo('America/New_York')
+
+    user.timezone = 'Europe/Paris'
+    db.session.commit()
+    assert load_identity(user.id).timezone == 'America/New_York'
+
+    invalidate_identity(user.id)
+    db.session.commit()
+    assert load_identity(user.id).zone == ZoneInfo('Europe/Paris')
+
+def test_load_identity_returns_none_for_unknown_user(app):
+    assert load_identity(999999) is None
+
+def test_cached_identity_needs_no_query(schedule_activity, db):
+    user_id = schedule_activity.schedule.user_id
+    load_identity(user_id)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert load_identity(user_id).id == user_id
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
@@ -0,0 +1,86 @@
+# tests/test_jobs.py
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from app.jobs import enqueue, claim_jobs, run_job, work, job_handler
+from app.models import Job
+from app.utils import _as_utc
+
+@job_handler('test_echo')
+def _echo(payload):
+    if payload.get('fail'):
+        raise RuntimeError('boom')
+    return {'echo': payload['value']}
+
+@pytest.fixture
+def clean_jobs(db):
+    db.session.rollback()
+    yield
+    Job.query.delete()
+    db.session.commit()
+
+def test_claim_jobs_marks_each_job_once(app, db, clean_jobs):
+    first = enqueue('test_echo', {'value': 1})
+    second = enqueue('test_echo', {'value': 2})
+
+    assert claim_jobs(10) == [first.id, second.id]
+    assert claim_jobs(10) == []
+    db.session.expire_all()
+    assert db.session.get(Job, first.id).status == 'running'
+    assert db.session.get(Job, first.id).attempts == 1
+
+def test_worker_runs_jobs_and_records_failures(app, db, clean_jobs):
+    ok = enqueue('test_echo', {'value': 'hi'})
+    bad = enqueue('test_echo', {'fail': True})
+
+    assert work(app, concurrency=1, burst=True) == 2
+    db.session.expire_all()
+    assert db.session.get(Job, ok.id).status == 'done'
+    assert db.session.get(Job, ok.id).result == {'echo': 'hi'}
+    failing = db.session.get(Job, bad.id)
+    assert (failing.status, failing.attempts) == ('queued', 1)
+    assert 'boom' in failing.error
+
+    # Retried with backoff until JOBS_MAX_ATTEMPTS, then failed for good
+    while failing.status == 'queued':
+        assert claim_jobs(10) == []
+        assert claim_jobs(10, now=_as_utc(failing.next_attempt_at)) == [bad.id]
+        run_job(bad.id)
+        db.session.expire_all()
+        failing = db.session.get(Job, bad.id)
+    assert (failing.status, failing.attempts) == ('failed', app.config['JOBS_MAX_ATTEMPTS'])
+
+def test_stale_running_jobs_are_reclaimed_then_failed(app, db, clean_jobs):
+    job = enqueue('test_echo', {'value': 1})
+    now = datetime.now(timezone.utc)
+    lease = timedelta(seconds=app.config['JOBS_LEASE_SECONDS'])
+    assert claim_jobs(10, now=now) == [job.id]
+
+    # The worker died: nobody else may take the job until its lease runs out
+    assert claim_jobs(10, now=now + lease - timedelta(seconds=1)) == []
+    for _ in range(2, app.config['JOBS_MAX_ATTEMPTS'] + 1):
+        now += lease + timedelta(seconds=1)
+        assert claim_jobs(10, now=now) == [job.id]
+
+    assert claim_jobs(10, now=now + lease + timedelta(seconds=1)) == []
+    db.session.expire_all()
+    stale = db.session.get(Job, job.id)
+    assert (stale.status, stale.attempts, stale.error) == ('failed', app.config['JOBS_MAX_ATTEMPTS'], 'Lease expired')
+
+def test_enqueue_rejects_unknown_kind(app, clean_jobs):
+    with pytest.raises(ValueError):
+        enqueue('no_such_job')
+
+def test_job_status_reports_a_short_error(app, db, clean_jobs, schedule_activity):
+    user_id = schedule_activity.schedule.user_id
+    job = enqueue('test_echo', {'fail': True}, user_id=user_id)
+    db.session.execute(Job.__table__.update().where(Job.__table__.c.id == job.id).values(attempts=app.config['JOBS_MAX_ATTEMPTS']))
+    db.session.commit()
+    run_job(job.id)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    body = client.get(f'/jobs/{job.id}').get_json()
+    assert (body['status'], body['error']) == ('failed', 'RuntimeError: boom')
+    assert 'Traceback' not in str(body)
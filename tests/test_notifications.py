@@ -0,0 +1,180 @@
+# tests/test_notifications.py
+
+import pytest
+from datetime import datetime, timezone, timedelta
+from app.models import ActivityInstance, Notification
+from app.notifications import CHANNEL_SENDERS, Dispatcher, TimingWheel, channel_sender
+from app.utils import create_activity_instances
+
+@pytest.fixture
+def sent_reminders():
+    sent = []
+    channel_sender('test')(sent.extend)
+    yield sent
+    CHANNEL_SENDERS.pop('test')
+
+def test_timing_wheel_pops_due_items_in_order():
+    now = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+    wheel = TimingWheel(tick_seconds=10, horizon_seconds=60)
+    assert wheel.pop_due(now) == []
+
+    wheel.add(now + timedelta(seconds=25), 'b')
+    wheel.add(now + timedelta(seconds=21), 'a')
+    wheel.add(now - timedelta(minutes=5), 'overdue')
+    assert not wheel.add(now + timedelta(minutes=5), 'too far')
+    assert len(wheel) == 3
+
+    # Slots already popped are closed; overdue items land in the next one
+    assert wheel.pop_due(now + timedelta(seconds=10)) == ['overdue']
+    assert wheel.pop_due(now + timedelta(seconds=30)) == ['a', 'b']
+    assert len(wheel) == 0
+
+def test_dispatcher_sends_due_reminders_once(schedule_activity, db, sent_reminders):
+    schedule_activity.generate_notifications = True
+    db.session.commit()
+    create_activity_instances(schedule_activity)
+    first, second = ActivityInstance.query.filter(
+        ActivityInstance.schedule_activity_id == schedule_activity.id
+    ).order_by(ActivityInstance.instance_date).limit(2).all()
+    due_at = first.instance_date.replace(tzinfo=timezone.utc)
+
+    dispatcher = Dispatcher(tick_seconds=10, lookahead_minutes=10, channels=['test'])
+    assert dispatcher.tick(due_at - timedelta(minutes=5)) == 0
+    assert len(dispatcher.wheel) == 1
+    assert dispatcher.tick(due_at) == 1
+    assert dispatcher.tick(due_at + timedelta(seconds=10)) == 0
+    assert [reminder.instance_id for reminder in sent_reminders] == [first.id]
+
+    # Completed after being queued: dropped by the pre-send re-check
+    second_due = second.instance_date.replace(tzinfo=timezone.utc)
+    dispatcher = Dispatcher(tick_seconds=10, lookahead_minutes=10, channels=['test'])
+    dispatcher.tick(second_due - timedelta(minutes=1))
+    second.completed = True
+    db.session.commit()
+    assert dispatcher.tick(second_due) == 0
+
+    db.session.query(Notification).filter_by(schedule_activity_id=schedule_activity.id).delete()
+    db.session.commit()
+
+def test_dispatcher_queues_a_reminder_per_channel_the_user_can_receive(schedule_activity, db):
+    schedule_activity.generate_notifications = True
+    schedule_activity.schedule.user.mobile = ''
+    db.session.commit()
+    create_activity_instances(schedule_activity)
+    first = ActivityInstance.query.filter(
+        ActivityInstance.schedule_activity_id == schedule_activity.id
+    ).order_by(ActivityInstance.instance_date).first()
+    due_at = first.instance_date.replace(tzinfo=timezone.utc)
+
+    # No mobile number, so no SMS; channels without a contact field always apply
+    dispatcher = Dispatcher(tick_seconds=10, lookahead_minutes=10, channels=['email', 'sms', 'push'], deliver=False)
+    dispatcher.tick(due_at - timedelta(minutes=5))
+    assert sorted(reminder.channel for reminder in dispatcher.wheel.pop_due(due_at)) == ['email', 'push']
+
+    dispatcher = Dispatcher(tick_seconds=10, lookahead_minutes=10, channels=['email', 'sms', 'push'], deliver=False)
+    dispatcher.tick(due_at - timedelta(minutes=5))
+    dispatcher.tick(due_at)
+    rows = Notification.query.filter_by(schedule_activity_id=schedule_activity.id).all()
+    assert sorted((row.activity_instance_id, row.notification_type) for row in rows) == [(first.id, 'email'), (first.id, 'push')]
+
+    db.session.query(Notification).filter_by(schedule_activity_id=schedule_activity.id).delete()
+    db.session.commit()
+
+def test_email_channel_sends_reminder_emails(schedule_activity, db):
+    from app.email_service import FakeTransport
+    from app.extensions import email_service
+    from app.notifications import CHANNEL_LOADERS, Reminder
+
+    transport, email_service.transport = email_service.transport, FakeTransport()
+    try:
+        due_at = datetime(2024, 1, 2, 12, 0, tzinfo=timezone.utc)
+        reminders = [Reminder(1, schedule_activity.schedule.user_id, schedule_activity.id, due_at, 'email')]
+        CHANNEL_SENDERS['email'](reminders, CHANNEL_LOADERS['email'](reminders))
+        message, = email_service.transport.outbox
+    finally:
+        email_service.transport = transport
+    assert message.to == 'util@example.com'
+    assert message.subject == 'Reminder: Stretch at 07:00 AM'
+
+def test_outbox_dedupes_and_retries_failures(app, schedule_activity, db, sent_reminders):
+    from app import outbox
+    from app.models import Notification
+    from app.notifications import Reminder, deliver
+
+    user_id = schedule_activity.schedule.user_id
+    now = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+    reminder = Reminder(None, user_id, schedule_activity.id, now, 'test')
+    missing = Reminder(None, user_id, schedule_activity.id, now, 'missing')
+    assert len(outbox.enqueue([reminder, missing], now)) == 2
+    assert outbox.enqueue([reminder], now) == []
+
+    # A claimed row is leased away from other workers
+    claimed = outbox.claim(10, now)
+    assert {row.notification_type for row in claimed} == {'test', 'missing'}
+    assert outbox.claim(10, now) == []
+
+    lease_over = now + timedelta(seconds=app.config['OUTBOX_LEASE_SECONDS'])
+    assert deliver(lease_over) == 1
+    assert sent_reminders == [reminder]
+    rows = {row.notification_type: row for row in Notification.query.filter_by(schedule_activity_id=schedule_activity.id)}
+    assert rows['test'].status == 'sent' and rows['test'].attempts == 2
+    assert rows['missing'].status == 'pending' and 'missing' in rows['missing'].last_error
+
+    db.session.query(Notification).filter_by(schedule_activity_id=schedule_activity.id).delete()
+    db.session.commit()
+
+def test_slow_channel_does_not_hold_up_the_others(app, schedule_activity, db, monkeypatch):
+    from app import outbox
+    from app.email_service import FakeTransport
+    from app.extensions import notification_channels
+    from app.models import Notification
+    from app.notifications import Reminder, deliver
+
+    monkeypatch.setattr(notification_channels['sms'], 'transport', FakeTransport(delay=0.5))
+    monkeypatch.setattr(notification_channels['push'], 'transport', FakeTransport())
+    settled = []
+    mark_sent = outbox.mark_sent
+    monkeypatch.setattr(outbox, 'mark_sent', lambda ids, now: settled.append(ids) or mark_sent(ids, now))
+
+    user_id = schedule_activity.schedule.user_id
+    now = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+    sms_id, push_id = outbox.enqueue([
+        Reminder(None, user_id, schedule_activity.id, now, 'sms'),
+        Reminder(None, user_id, schedule_activity.id, now, 'push'),
+    ], now)
+
+    # Each channel is claimed and marked on its own, the fast one first
+    assert deliver(now) == 2
+    assert settled == [[push_id], [sms_id]]
+
+    db.session.query(Notification).filter_by(schedule_activity_id=schedule_activity.id).delete()
+    db.session.commit()
+
+def test_throttled_channel_is_claimed_once_per_pass(app, schedule_activity, db, monkeypatch):
+    from app import outbox
+    from app.channels import CircuitBreaker
+    from app.extensions import notification_channels
+    from app.models import Notification
+    from app.notifications import Reminder, deliver
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    breaker.record(False)
+    monkeypatch.setattr(notification_channels['sms'], 'breaker', breaker)
+    claims = []
+    claim = outbox.claim
+    monkeypatch.setattr(outbox, 'claim', lambda limit, now, channel=None: claims.append(channel) or claim(limit, now, channel))
+
+    user_id = schedule_activity.schedule.user_id
+    now = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+    outbox.enqueue([
+        Reminder(None, user_id, schedule_activity.id, now + timedelta(minutes=minute), 'sms') for minute in range(3)
+    ], now + timedelta(minutes=2))
+
+    # The first batch comes back deferred by the open breaker, so the other two wait for the next pass
+    assert deliver(now + timedelta(minutes=2), batch_size=1) == 0
+    assert claims == ['sms']
+    rows = Notification.query.filter_by(schedule_activity_id=schedule_activity.id).all()
+    assert sorted(row.attempts for row in rows) == [0, 0, 0]
+
+    db.session.query(Notification).filter_by(schedule_activity_id=schedule_activity.id).delete()
+    db.session.commit()
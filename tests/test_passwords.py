@@ -0,0 +1,36 @@
+# tests/test_passwords.py
+
+import pytest
+from flask import Flask
+from app.extensions import password_hasher
+from app.models import User
+from app.passwords import PasswordHasher, PasswordHasherBusy
+
+def _hasher(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    return PasswordHasher(app)
+
+def test_check_password_rehashes_when_method_changes(app):
+    old = _hasher(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+    user = User(password_hash=old.hash('secret'))
+    assert password_hasher.needs_rehash(user.password_hash)
+
+    assert not user.check_password('wrong')
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+    assert user.check_password('secret')
+    assert not password_hasher.needs_rehash(user.password_hash)
+    assert user.check_password('secret')
+
+def test_hasher_rejects_when_queue_is_full():
+    hasher = _hasher(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_QUEUE=0)
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+    hasher._slots.acquire()
+    with pytest.raises(PasswordHasherBusy) as excinfo:
+        hasher.hash('secret')
+    assert excinfo.value.code == 503
+
+    stats = hasher.stats()
+    assert stats['rejected'] == 1
+    assert stats['hash']['count'] == 1 and stats['verify']['count'] == 1
@@ -0,0 +1,50 @@
+# tests/test_recurrence.py
+
+import pytest
+from datetime import datetime, date, time, timezone
+from zoneinfo import ZoneInfo
+from dateutil.rrule import rrulestr
+from app.recurrence import normalize_rule, occurrence_dates, local_dates_to_utc, cache_stats, clear_caches
+
+def test_normalize_rule_ignores_prefix_case_and_part_order():
+    assert normalize_rule('RRULE:FREQ=WEEKLY;BYDAY=SA,SU') == normalize_rule('byday=SA,SU;freq=weekly')
+
+def test_occurrence_dates_are_cached_per_window():
+    clear_caches()
+    user_tz = ZoneInfo('America/Los_Angeles')
+    dtstart = datetime(2024, 1, 1, 15, 0, tzinfo=timezone.utc)
+
+    first = occurrence_dates('RRULE:FREQ=WEEKLY;BYDAY=SA,SU', dtstart, user_tz, date(2024, 3, 1), date(2024, 3, 10))
+    second = occurrence_dates('FREQ=WEEKLY;BYDAY=SA,SU', dtstart, user_tz, date(2024, 3, 1), date(2024, 3, 10))
+
+    assert first == (date(2024, 3, 2), date(2024, 3, 3), date(2024, 3, 9), date(2024, 3, 10))
+    assert second == first
+    stats = cache_stats()
+    assert stats['occurrences']['hits'] == 1
+    assert stats['occurrences']['misses'] == 1
+
+@pytest.mark.parametrize('rule', [
+    'RRULE:FREQ=DAILY',
+    'RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    'RRULE:FREQ=WEEKLY;BYDAY=SA,SU',
+    'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TU',
+    'RRULE:FREQ=DAILY;COUNT=5',
+])
+def test_occurrence_dates_match_dateutil_across_dst(rule):
+    user_tz = ZoneInfo('America/New_York')
+    dtstart = datetime(2024, 1, 3, 14, 30, tzinfo=timezone.utc)
+    start_date, end_date = date(2024, 1, 1), date(2024, 12, 31)
+
+    expected = tuple(
+        occurrence.date()
+        for occurrence in rrulestr(rule, dtstart=dtstart.astimezone(user_tz)).between(
+            datetime.combine(start_date, time.min, tzinfo=user_tz),
+            datetime.combine(end_date, time.max, tzinfo=user_tz),
+            inc=True
+        )
+    )
+    dates = occurrence_dates(rule, dtstart, user_tz, start_date, end_date)
+    assert dates == expected
+    assert local_dates_to_utc(dates, time(9, 30), user_tz) == [
+        datetime.combine(local_date, time(9, 30), tzinfo=user_tz).astimezone(timezone.utc) for local_date in dates
+    ]
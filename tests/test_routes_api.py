@@ -0,0 +1,153 @@
+# tests/test_routes_api.py
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from flask_jwt_extended import create_refresh_token, decode_token
+from sqlalchemy import event
+from app.claims import issue_token, REFRESHED_TOKEN_HEADER
+from app.identity import invalidate_identity
+from app.extensions import schedule_cache
+
+def _auth_headers(user_id):
+    return {'Authorization': f'Bearer {issue_token(user_id)}'}
+
+def test_schedule_range_streams_days_in_local_time(app, schedule_activity):
+    user_id = schedule_activity.schedule.user_id
+    start = datetime.now(ZoneInfo('America/New_York')).date() + timedelta(days=1)
+    end = start + timedelta(days=6)
+
+    response = app.test_client().get(
+        f'/api/schedule/range?start={start.isoformat()}&end={end.isoformat()}',
+        headers=_auth_headers(user_id)
+    )
+    assert response.status_code == 200
+    assert response.is_streamed
+
+    data = response.get_json()
+    assert data['timezone'] == 'America/New_York'
+    assert [day['date'] for day in data['days']] == [(start + timedelta(days=n)).isoformat() for n in range(7)]
+    assert data['days'][0]['instances'][0]['start'].startswith(f'{start.isoformat()}T07:00:00')
+
+def test_schedule_range_rejects_oversized_window(app, schedule_activity):
+    response = app.test_client().get(
+        '/api/schedule/range?start=2024-01-01&end=2024-12-31',
+        headers=_auth_headers(schedule_activity.schedule.user_id)
+    )
+    assert response.status_code == 400
+
+def test_schedule_list_honours_if_none_match(app, schedule_activity, db):
+    client = app.test_client()
+    user_id = schedule_activity.schedule.user_id
+
+    first = client.get('/api/schedules', headers=_auth_headers(user_id))
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    cached = client.get('/api/schedules', headers={**_auth_headers(user_id), 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    schedule_cache.invalidate_user(user_id)
+    db.session.commit()
+    changed = client.get('/api/schedules', headers={**_auth_headers(user_id), 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_token_claims_are_trusted_without_reading_the_database(app, schedule_activity, db):
+    client = app.test_client()
+    headers = _auth_headers(schedule_activity.schedule.user_id)
+    client.get('/api/schedules', headers=headers)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/api/schedules', headers={**headers, 'If-None-Match': '"unmatched"'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    assert not any('identity_version' in statement or 'FROM users' in statement for statement in statements)
+
+def test_tokens_are_revoked_through_the_shared_cache(app, schedule_activity, db, fake_redis):
+    client = app.test_client()
+    user = schedule_activity.schedule.user
+    headers = _auth_headers(user.id)
+    assert REFRESHED_TOKEN_HEADER not in client.get('/api/schedules', headers=headers).headers
+
+    # A profile write from any worker bumps the counter every worker checks tokens against
+    user.timezone = 'Europe/Paris'
+    invalidate_identity(user.id)
+    db.session.commit()
+    response = client.get('/api/schedules', headers=headers)
+    claims = decode_token(response.headers[REFRESHED_TOKEN_HEADER])
+    assert (claims['tz'], claims['ver']) == ('Europe/Paris', schedule_cache.version(f'identity:{user.id}'))
+
+    refreshed = {'Authorization': f'Bearer {response.headers[REFRESHED_TOKEN_HEADER]}'}
+    assert REFRESHED_TOKEN_HEADER not in client.get('/api/schedules', headers=refreshed).headers
+
+def test_activity_details_etag_changes_when_notifications_toggle(app, schedule_activity):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(schedule_activity.schedule.user_id)
+    url = f'/edit_activity/{schedule_activity.schedule_id}/{schedule_activity.id}'
+
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    toggled = client.post(f'/update_activity_notifications/{schedule_activity.id}',
+                          json={'generate_notifications': not first.get_json()['generate_notifications']})
+    assert toggled.status_code == 200
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_json()['generate_notifications'] is toggled.get_json()['new_state']
+
+def test_token_claims_carry_timezone_and_are_reissued_after_profile_change(app, schedule_activity, db):
+    client = app.test_client()
+    user = schedule_activity.schedule.user
+    headers = _auth_headers(user.id)
+    claims = decode_token(headers['Authorization'].split()[1])
+    assert claims['sub'] == str(user.id)
+    assert claims['tz'] == 'America/New_York'
+    assert claims['roles'] == []
+
+    assert client.put('/api/profile', json={'timezone': 'Mars/Olympus'}, headers=headers).status_code == 400
+    response = client.put('/api/profile', json={'timezone': 'Asia/Tokyo'}, headers=headers)
+    assert response.status_code == 200
+    assert decode_token(response.get_json()['access_token'])['tz'] == 'Asia/Tokyo'
+    db.session.refresh(user)
+    assert user.timezone == 'Asia/Tokyo'
+
+def test_refresh_token_mints_an_access_token_from_the_current_row(app, schedule_activity, db):
+    client = app.test_client()
+    user = schedule_activity.schedule.user
+    refresh_token = create_refresh_token(identity=str(user.id))
+
+    user.timezone = 'Asia/Tokyo'
+    invalidate_identity(user.id)
+    db.session.commit()
+    response = client.post('/api/token/refresh', headers={'Authorization': f'Bearer {refresh_token}'})
+    assert response.status_code == 200
+    assert decode_token(response.get_json()['access_token'])['tz'] == 'Asia/Tokyo'
+
+    # Access tokens are not accepted in place of refresh tokens
+    assert client.post('/api/token/refresh', headers=_auth_headers(user.id)).status_code == 422
+
+def test_adding_an_activity_queues_its_materialization(app, schedule_activity, db):
+    from app.models import Job, ScheduleActivity
+
+    response = app.test_client().post(
+        f'/api/schedule/{schedule_activity.schedule_id}/activity',
+        data={'activity_id': schedule_activity.activity_id, 'start_time': '08:30', 'duration': '15',
+              'recurrence': 'FREQ=DAILY'},
+        headers=_auth_headers(schedule_activity.schedule.user_id)
+    )
+    assert response.status_code == 201
+    new_id = response.get_json()['id']
+    job = Job.query.filter_by(kind='extend_activity').one()
+    assert job.payload == {'schedule_activity_id': new_id}
+    assert job.user_id == schedule_activity.schedule.user_id
+
+    db.session.delete(job)
+    db.session.delete(db.session.get(ScheduleActivity, new_id))
+    db.session.commit()
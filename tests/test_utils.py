@@ -0,0 +1,185 @@
+# tests/test_utils.py
+
+from datetime import date, datetime, time, timezone, timedelta
+from zoneinfo import ZoneInfo
+from sqlalchemy import func, select
+from app.models import Activity, ActivityInstance, Category, Schedule, ScheduleActivity, User
+from app.regeneration import regenerate_all, regenerate_users, shard_user_ids
+from app.utils import (
+    create_activity_instances, reconcile_activity_instances, extend_activity_instances, update_future_instances, get_user_schedule, iter_user_schedule, materialize_instance, VirtualInstance
+)
+
+def test_create_activity_instances_returns_counts(schedule_activity):
+    first = create_activity_instances(schedule_activity)
+    stored = ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).count()
+    assert first == {'deleted': 0, 'inserted': stored}
+    assert 28 <= stored <= 29
+
+    second = create_activity_instances(schedule_activity)
+    assert second == {'deleted': stored, 'inserted': stored}
+    assert schedule_activity.materialized_until is not None
+
+def test_create_activity_instances_uses_local_start_time(schedule_activity):
+    create_activity_instances(schedule_activity)
+    instance = ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).first()
+    assert instance.completed is False
+    local = instance.instance_date.replace(tzinfo=timezone.utc).astimezone(ZoneInfo('America/New_York'))
+    assert local.time() == time(7, 0)
+
+def test_reconcile_moves_pending_rows_and_keeps_completed(schedule_activity, db):
+    stored = create_activity_instances(schedule_activity)['inserted']
+    completed = ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).order_by(
+        ActivityInstance.instance_date).first()
+    completed.completed = True
+    completed_date = completed.instance_date
+    db.session.commit()
+
+    schedule_activity.start_time = time(7, 15)
+    db.session.commit()
+    counts = reconcile_activity_instances(schedule_activity)
+
+    assert counts == {'inserted': 0, 'updated': stored - 1, 'deleted': 0, 'unchanged': 1}
+    db.session.expire_all()
+    assert db.session.get(ActivityInstance, completed.id).instance_date == completed_date
+    assert ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).count() == stored
+
+    assert reconcile_activity_instances(schedule_activity)['updated'] == 0
+
+def test_extend_activity_instances_resumes_from_watermark(schedule_activity, db):
+    user_tz = ZoneInfo('America/New_York')
+    horizon_end = datetime.now(timezone.utc) + timedelta(days=14)
+
+    first = extend_activity_instances(schedule_activity, user_tz, horizon_end, chunk_days=5)
+    assert first >= 14
+    assert schedule_activity.materialized_until.replace(tzinfo=timezone.utc) == horizon_end
+
+    assert extend_activity_instances(schedule_activity, user_tz, horizon_end, chunk_days=5) == 0
+    later = extend_activity_instances(schedule_activity, user_tz, horizon_end + timedelta(days=7), chunk_days=5)
+    assert later == 7
+
+def test_get_user_schedule_expands_virtual_instances(schedule_activity):
+    user_tz = ZoneInfo('America/New_York')
+    day = datetime.now(user_tz).date() + timedelta(days=3)
+
+    schedule = get_user_schedule(schedule_activity.schedule.user_id, day, day, user_tz)
+    assert list(schedule) == [day]
+    assert isinstance(schedule[day][0], VirtualInstance)
+    assert ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).count() == 0
+
+def test_materialize_instance_persists_once(schedule_activity):
+    user_tz = ZoneInfo('America/New_York')
+    day = datetime.now(user_tz).date() + timedelta(days=3)
+
+    instance = materialize_instance(schedule_activity, day, user_tz)
+    assert instance.id is not None
+    assert materialize_instance(schedule_activity, day, user_tz).id == instance.id
+
+    schedule = get_user_schedule(schedule_activity.schedule.user_id, day, day, user_tz)
+    assert schedule[day] == [instance]
+
+def test_iter_user_schedule_merges_stored_rows_day_by_day(schedule_activity):
+    user_tz = ZoneInfo('America/New_York')
+    start = datetime.now(user_tz).date() + timedelta(days=3)
+    stored = materialize_instance(schedule_activity, start + timedelta(days=1), user_tz)
+
+    days = iter_user_schedule(schedule_activity.schedule.user_id, start, start + timedelta(days=2), user_tz)
+    assert next(days)[0] == start
+    assert next(days) == (start + timedelta(days=1), [stored])
+    day, instances = next(days)
+    assert day == start + timedelta(days=2) and isinstance(instances[0], VirtualInstance)
+    assert next(days, None) is None
+
+def test_regenerate_users_uses_schedule_owner_timezone(schedule_activity):
+    summary = regenerate_users([schedule_activity.schedule.user_id])
+    assert summary['schedule_activities'] == 1
+    assert summary['inserted'] >= 28
+
+    instance = ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id).first()
+    local = instance.instance_date.replace(tzinfo=timezone.utc).astimezone(ZoneInfo('America/New_York'))
+    assert local.time() == time(7, 0)
+
+def test_shard_user_ids_keeps_each_user_in_one_shard():
+    shards = shard_user_ids([1, 2, 3, 4, 5], 2)
+    assert sorted(sum(shards, [])) == [1, 2, 3, 4, 5]
+    assert len(shards) == 2
+
+def test_update_future_instances_moves_pending_rows_in_local_time(schedule_activity, db):
+    create_activity_instances(schedule_activity)
+    future = ActivityInstance.query.filter(
+        ActivityInstance.schedule_activity_id == schedule_activity.id,
+        ActivityInstance.instance_date > datetime.now(timezone.utc)
+    ).count()
+
+    schedule_activity.start_time = time(18, 45)
+    db.session.commit()
+    assert update_future_instances(schedule_activity, ['start_time']) == future
+
+    db.session.expire_all()
+    user_tz = ZoneInfo('America/New_York')
+    for instance in ActivityInstance.query.filter_by(schedule_activity_id=schedule_activity.id):
+        local = instance.instance_date.replace(tzinfo=timezone.utc).astimezone(user_tz)
+        assert local.time() in (time(7, 0), time(18, 45))
+
+def test_instance_writes_denormalize_schedule_user(schedule_activity):
+    user_id = schedule_activity.schedule.user_id
+    create_activity_instances(schedule_activity)
+    user_tz = ZoneInfo('America/New_York')
+    touched = materialize_instance(schedule_activity, datetime.now(user_tz).date() + timedelta(days=60), user_tz)
+
+    assert touched.user_id == user_id
+    assert ActivityInstance.query.filter(
+        ActivityInstance.schedule_activity_id == schedule_activity.id,
+        ActivityInstance.user_id.is_(None)
+    ).count() == 0
+
+def test_regenerate_all_shards_users_across_worker_processes(tmp_path, monkeypatch):
+    from app import create_app
+    from app.extensions import db, email_service, notification_channels, password_hasher, schedule_cache
+    from config import TestConfig
+
+    # A second app re-initialises the shared extensions; put them back afterwards
+    for extension in (schedule_cache, password_hasher, email_service, notification_channels):
+        for name, value in vars(extension).items():
+            monkeypatch.setattr(extension, name, value)
+    # Worker processes open the same file, so the database cannot be in-memory
+    file_app = create_app(type('FileConfig', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'regenerate.db'}",
+    }))
+
+    with file_app.app_context():
+        db.create_all()
+        category = Category(code='regen', name='Regen')
+        db.session.add(category)
+        for index, tz_name in enumerate(('America/New_York', 'Asia/Tokyo', 'Europe/Paris')):
+            user = User(first_name='Regen', last_name=str(index), email=f'regen{index}@example.com',
+                        mobile=f'55500022{index:02d}', timezone=tz_name, password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            schedule = Schedule(owner_id=user.id, user_id=user.id, name='Regen', start_date=date(2024, 1, 1))
+            activity = Activity(owner_id=user.id, category=category, title='Walk', step=1,
+                                duration=10, difficulty='Easy', exertion='Low')
+            db.session.add_all([schedule, activity])
+            db.session.flush()
+            db.session.add(ScheduleActivity(
+                schedule_id=schedule.id, activity_id=activity.id, start_time=time(7, 0),
+                dtstart=datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc), duration=10, recurrence='RRULE:FREQ=DAILY'
+            ))
+        db.session.commit()
+
+        summaries = regenerate_all(workers=2)
+        assert len(summaries) == 2
+        assert sum(summary['users'] for summary in summaries) == 3
+        assert sum(summary['schedule_activities'] for summary in summaries) == 3
+
+        # Every row a worker reports is in the file exactly once
+        stored = db.session.execute(
+            select(ActivityInstance.schedule_activity_id, func.count(), func.count(ActivityInstance.instance_date.distinct()))
+            .group_by(ActivityInstance.schedule_activity_id)
+        ).all()
+        assert len(stored) == 3
+        assert all(count == distinct and 28 <= count <= 29 for _, count, distinct in stored)
+        assert sum(summary['inserted'] for summary in summaries) == sum(count for _, count, _ in stored)
+
+        # A second run finds nothing to do
+        assert sum(summary['inserted'] for summary in regenerate_all(workers=2)) == 0
+        db.session.remove()